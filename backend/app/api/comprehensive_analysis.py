@@ -16,7 +16,7 @@ import io
 
 from app.services.mcp_server import get_mcp_server, ProcessingIntent
 from app.services.document_ai_service import DocumentAIService
-from app.services.pdf_report_service import LegalReportGenerator
+from app.services.pdf_report_service import LegalReportGenerator, iter_pdf_chunks
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -661,19 +661,22 @@ async def generate_pdf_report(request: PDFGenerationRequest):
  # Create PDF report service
  pdf_service = LegalReportGenerator()
  
- # Generate PDF bytes
- pdf_bytes = await pdf_service.generate_comprehensive_report(
+ # Render into a spooled temp file and stream it out without ever
+ # materialising the whole PDF as one bytes object
+ output = await pdf_service.generate_report_spooled(
  analysis_data=request.analysis_data,
  filename=request.filename
  )
+ pdf_size = output.seek(0, 2)
+ output.seek(0)
  
  # Create streaming response
  return StreamingResponse(
- io.BytesIO(pdf_bytes),
+ iter_pdf_chunks(output),
  media_type="application/pdf",
  headers={
  "Content-Disposition": f"attachment; filename={request.filename}",
- "Content-Length": str(len(pdf_bytes))
+ "Content-Length": str(pdf_size)
  }
  )
  
@@ -815,20 +818,22 @@ async def generate_pdf_from_document(request: DocumentPDFRequest):
  # Generate the PDF filename
  filename = f"comprehensive_analysis_{request.document_title.replace(' ', '_').lower()[:30] if request.document_title else 'legal_document'}.pdf"
  
- pdf_bytes = await pdf_service.generate_comprehensive_report(
+ output = await pdf_service.generate_report_spooled(
  analysis_data=analysis_result,
  filename=filename
  )
+ pdf_size = output.seek(0, 2)
+ output.seek(0)
  
- logger.info(f" Generated PDF with {len(pdf_bytes)} bytes using REAL analysis data")
+ logger.info(f" Generated PDF with {pdf_size} bytes using REAL analysis data")
  
  # Return PDF as streaming response
  return StreamingResponse(
- io.BytesIO(pdf_bytes),
+ iter_pdf_chunks(output),
  media_type="application/pdf",
  headers={
  "Content-Disposition": f"attachment; filename={filename}",
- "Content-Length": str(len(pdf_bytes))
+ "Content-Length": str(pdf_size)
  }
  )
  
@@ -9,7 +9,7 @@ import logging
 from pydantic import BaseModel
 
 from app.services.spanner_service import SpannerService
-from app.services.gemini_service import GeminiService
+from app.services.gemini_service import GeminiService, get_gemini_service
 
 logger = logging.getLogger(__name__)
 
@@ -36,7 +36,6 @@ class MultipleTermsResponse(BaseModel):
 
 # Services will be initialized lazily
 spanner_service = None
-gemini_service = None
 
 def get_spanner_service():
  """Get Spanner service instance (lazy initialization)."""
@@ -45,13 +44,6 @@ def get_spanner_service():
  spanner_service = SpannerService()
  return spanner_service
 
-def get_gemini_service():
- """Get Gemini service instance (lazy initialization)."""
- global gemini_service
- if gemini_service is None:
- gemini_service = GeminiService()
- return gemini_service
-
 @router.get("/search", response_model=DictionarySearchResponse)
 async def search_legal_term(
  term: str = Query(..., description="Legal term to search for")
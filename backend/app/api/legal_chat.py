@@ -6,7 +6,7 @@ Legal Chat API Endpoints
 import logging
 from typing import List
 from fastapi import APIRouter, HTTPException, Depends
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 
 from app.services.legal_text_service import LegalTextSimplificationService
 from app.schemas.legal_chat_schemas import (
@@ -57,6 +57,32 @@ async def simplify_text(request: SimplifyTextRequest):
  logger.error(f"Error simplifying text: {str(e)}")
  raise HTTPException(status_code=500, detail=f"Error simplifying text: {str(e)}")
 
+@router.post("/simplify/stream")
+async def simplify_text_stream(request: SimplifyTextRequest):
+ """
+ Streaming text simplification endpoint.
+
+ Pushes simplified text to the client as it is generated instead of
+ waiting for the full response, so the first tokens arrive as soon as
+ the model starts producing output. Note: no term extraction here --
+ use /process-document (or /simplify) when complex terms are needed.
+ """
+ try:
+ logger.info(f"Streaming simplification for user: {request.user_email}")
+
+ async def event_stream():
+ async for chunk in legal_service.gemini_service.simplify_legal_text_stream(request.text):
+ yield chunk
+
+ return StreamingResponse(
+ event_stream(),
+ media_type="text/plain; charset=utf-8"
+ )
+
+ except Exception as e:
+ logger.error(f"Error streaming simplified text: {str(e)}")
+ raise HTTPException(status_code=500, detail=f"Error simplifying text: {str(e)}")
+
 @router.post("/process-document", response_model=ProcessDocumentResponse)
 async def process_legal_document(request: ProcessDocumentRequest):
  """
@@ -90,12 +90,7 @@ async def process_text_with_mcp(request: MCPTextRequest):
  if result.success:
  logger.info(f" MCP API: Request processed successfully in {result.processing_time:.2f}s")
  logger.info(f" MCP API: Result source: {result.source}")
- return {
- "success": True,
- "data": result.data,
- "processing_time": result.processing_time,
- "source": result.source
- }
+ return Response(content=result.to_bytes(), media_type="application/json")
  else:
  logger.error(f" MCP API: Request failed: {result.error}")
  raise HTTPException(status_code=500, detail=result.error)
@@ -135,13 +130,10 @@ async def process_document_with_mcp(
  )
  
  if result.success:
- return {
- "success": True,
- "data": result.data,
- "processing_time": result.processing_time,
- "source": result.source,
- "filename": file.filename
- }
+ return Response(
+ content=result.to_bytes(filename=file.filename),
+ media_type="application/json"
+ )
  else:
  raise HTTPException(status_code=500, detail=result.error)
  
@@ -171,12 +163,7 @@ async def lookup_term_with_mcp(request: MCPTermLookupRequest):
  )
  
  if result.success:
- return {
- "success": True,
- "data": result.data,
- "processing_time": result.processing_time,
- "source": result.source
- }
+ return Response(content=result.to_bytes(), media_type="application/json")
  else:
  raise HTTPException(status_code=404, detail=result.error)
  
@@ -201,12 +188,7 @@ async def legal_query_with_mcp(request: MCPQueryRequest):
  )
  
  if result.success:
- return {
- "success": True,
- "data": result.data,
- "processing_time": result.processing_time,
- "source": result.source
- }
+ return Response(content=result.to_bytes(), media_type="application/json")
  else:
  raise HTTPException(status_code=500, detail=result.error)
  
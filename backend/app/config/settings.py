@@ -32,9 +32,23 @@ class Settings(BaseSettings):
  # Spanner Configuration
  SPANNER_INSTANCE_ID: str
  SPANNER_DATABASE_ID: str
+ SPANNER_DEBUG: bool = False # Extra diagnostic queries on term-lookup misses
  
  # Gemini AI Configuration
  GEMINI_API_KEY: Optional[str] = None
+ GEMINI_MAX_CONCURRENCY: int = 8
+ GEMINI_QPM: int = 300 # Requests per minute budget; 0 disables the limiter
+ MIN_SIMPLIFY_WORDS: int = 40 # Below this, simplification returns the text as-is
+ # Law identification runs with Google Search grounding, which already
+ # supplies the authoritative law text - deep thinking on Pro is mostly
+ # redundant there. Override these to "gemini-3-pro-preview" / "high"
+ # if law-match quality regresses.
+ LAW_ID_MODEL: str = "gemini-3-flash-preview"
+ LAW_ID_THINKING: str = "medium"
+ # LLM response cache TTLs: context-specific calls go stale with the
+ # conversation, standalone definitions are near-immutable.
+ LLM_CACHE_TTL_CONTEXT: int = 900
+ LLM_CACHE_TTL_STANDALONE: int = 86400
  
  # Storage
  GCS_BUCKET_NAME: str
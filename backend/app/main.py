@@ -22,11 +22,18 @@ from app.api.mcp_routes import router as mcp_router
 from app.api.comprehensive_analysis import router as comprehensive_router
 from app.config.settings import get_settings
 
-# Configure logging
+# Configure logging. The req_id field is stamped by RequestIdFilter below
+# (a ContextVar set per request by the MCP server) so log lines from one
+# request can be grepped together without hand-built prefixes.
 logging.basicConfig(
  level=logging.INFO,
- format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+ format="%(asctime)s - %(name)s - %(levelname)s - [%(req_id)s] %(message)s"
 )
+
+from app.services.mcp_server import RequestIdFilter, get_mcp_server
+for _handler in logging.getLogger().handlers:
+ _handler.addFilter(RequestIdFilter())
+
 logger = logging.getLogger(__name__)
 
 # Get settings
@@ -86,6 +93,11 @@ app.include_router(
  tags=["comprehensive-analysis"]
 )
 
+@app.on_event("shutdown")
+async def shutdown_services():
+ """Release shared service clients when the app stops."""
+ await get_mcp_server().aclose()
+
 @app.get("/")
 async def root():
  """Root endpoint."""
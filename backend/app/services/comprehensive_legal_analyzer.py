@@ -17,7 +17,7 @@ from typing import Dict, List, Any
 from datetime import datetime
 import asyncio
 
-from .gemini_service import GeminiService
+from .gemini_service import GeminiService, get_gemini_service
 from .spanner_service import SpannerService
 
 logger = logging.getLogger(__name__)
@@ -29,7 +29,7 @@ class ComprehensiveLegalAnalyzer:
  """
  
  def __init__(self):
- self.gemini_service = GeminiService()
+ self.gemini_service = get_gemini_service()
  self.spanner_service = SpannerService()
  
  def _clean_markdown_formatting(self, text: str) -> str:
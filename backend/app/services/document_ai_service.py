@@ -11,7 +11,7 @@ import fitz # PyMuPDF
 from PIL import Image
 
 # Gemini 3 Service
-from app.services.gemini_service import GeminiService
+from app.services.gemini_service import GeminiService, get_gemini_service
 
 # Centralized credentials management
 from app.utils.credentials import get_credentials, get_project_id, is_credentials_available
@@ -31,7 +31,7 @@ class DocumentAIService:
  self._gemini_service = None
  if self.gemini_api_key:
  try:
- self._gemini_service = GeminiService()
+ self._gemini_service = get_gemini_service()
  logger.info("Gemini 3 service configured for document processing")
  except Exception as e:
  logger.warning(f"Gemini 3 init failed: {e}")
@@ -3,6 +3,7 @@ Firestore Service for User Data Management
 ==========================================
 """
 
+import asyncio
 import logging
 from datetime import datetime
 from typing import Dict, List, Optional
@@ -71,15 +72,15 @@ class FirestoreService:
  Document ID if successful, None otherwise
  """
  try:
- logger.info(f" Firestore: Starting save_user_summary for user: {user_email}")
+ logger.info(" Firestore: Starting save_user_summary for user: %s", user_email)
  
  # Check if db is available
  if not hasattr(self, 'db') or self.db is None:
- logger.error(f" Firestore: Database not initialized for user: {user_email}")
+ logger.error(" Firestore: Database not initialized for user: %s", user_email)
  return None
  
  # Use the same email format as documents (keep original @ format)
- logger.info(f" Firestore: Using email format: {user_email}")
+ logger.info(" Firestore: Using email format: %s", user_email)
  
  # Prepare the summary document
  doc_data = {
@@ -96,21 +97,23 @@ class FirestoreService:
  'gemini_fallbacks': summary_data.get('gemini_fallbacks', 0)
  }
  
- logger.info(f" Firestore: Prepared document data with {len(doc_data)} fields")
+ logger.info(" Firestore: Prepared document data with %d fields", len(doc_data))
  
  # Save to Firestore: users/{user_email}/summaries/{auto_generated_id}
- logger.info(f" Firestore: Creating document reference for user: {user_email}")
+ logger.info(" Firestore: Creating document reference for user: %s", user_email)
  user_doc_ref = self.db.collection('users').document(user_email)
  summary_ref = user_doc_ref.collection('summaries').document()
  
  logger.info(" Firestore: Setting document data...")
- summary_ref.set(doc_data)
+ # The firebase_admin client is synchronous; run blocking I/O off the
+ # event loop so concurrent requests don't serialise behind it
+ await asyncio.to_thread(summary_ref.set, doc_data)
  
- logger.info(f" Firestore: Summary saved for user {user_email} with summary ID: {summary_ref.id}")
+ logger.info(" Firestore: Summary saved for user %s with summary ID: %s", user_email, summary_ref.id)
  return summary_ref.id
  
  except Exception as e:
- logger.error(f"Error saving summary for user {user_email}: {str(e)}")
+ logger.error("Error saving summary for user %s: %s", user_email, e)
  return None
  
  async def get_user_summaries(self, user_email: str, limit: int = 10) -> List[Dict]:
@@ -133,7 +136,7 @@ class FirestoreService:
  
  # Query summaries ordered by creation date (newest first)
  query = summaries_ref.order_by('created_at', direction=firestore.Query.DESCENDING).limit(limit)
- docs = query.stream()
+ docs = await asyncio.to_thread(lambda: list(query.stream()))
  
  summaries = []
  for doc in docs:
@@ -144,7 +147,7 @@ class FirestoreService:
  return summaries
  
  except Exception as e:
- logger.error(f"Error getting summaries for user {user_email}: {str(e)}")
+ logger.error("Error getting summaries for user %s: %s", user_email, e)
  return []
  
  async def get_summary_by_id(self, user_email: str, summary_id: str) -> Optional[Dict]:
@@ -165,7 +168,7 @@ class FirestoreService:
  user_doc_ref = self.db.collection('users').document(user_email)
  summary_ref = user_doc_ref.collection('summaries').document(summary_id)
  
- doc = summary_ref.get()
+ doc = await asyncio.to_thread(summary_ref.get)
  if doc.exists:
  summary_data = doc.to_dict()
  summary_data['id'] = doc.id
@@ -174,7 +177,7 @@ class FirestoreService:
  return None
  
  except Exception as e:
- logger.error(f"Error getting summary {summary_id} for user {user_email}: {str(e)}")
+ logger.error("Error getting summary %s for user %s: %s", summary_id, user_email, e)
  return None
  
  async def delete_summary(self, user_email: str, summary_id: str) -> bool:
@@ -195,12 +198,12 @@ class FirestoreService:
  user_doc_ref = self.db.collection('users').document(user_email)
  summary_ref = user_doc_ref.collection('summaries').document(summary_id)
  
- summary_ref.delete()
- logger.info(f"Summary {summary_id} deleted for user {user_email}")
+ await asyncio.to_thread(summary_ref.delete)
+ logger.info("Summary %s deleted for user %s", summary_id, user_email)
  return True
  
  except Exception as e:
- logger.error(f"Error deleting summary {summary_id} for user {user_email}: {str(e)}")
+ logger.error("Error deleting summary %s for user %s: %s", summary_id, user_email, e)
  return False
  
  async def update_user_profile(self, user_email: str, profile_data: Dict) -> bool:
@@ -220,12 +223,12 @@ class FirestoreService:
  # Add updated timestamp
  profile_data['updated_at'] = datetime.utcnow()
  
- user_doc_ref.set(profile_data, merge=True)
- logger.info(f"Profile updated for user {user_email}")
+ await asyncio.to_thread(user_doc_ref.set, profile_data, merge=True)
+ logger.info("Profile updated for user %s", user_email)
  return True
  
  except Exception as e:
- logger.error(f"Error updating profile for user {user_email}: {str(e)}")
+ logger.error("Error updating profile for user %s: %s", user_email, e)
  return False
 
  async def store_document_metadata(self, user_email: str, document_id: str, metadata: Dict) -> bool:
@@ -253,12 +256,12 @@ class FirestoreService:
  metadata['created_at'] = datetime.utcnow()
  metadata['updated_at'] = datetime.utcnow()
  
- doc_ref.set(metadata)
- logger.info(f"Document metadata stored for user {user_email}, doc: {document_id}")
+ await asyncio.to_thread(doc_ref.set, metadata)
+ logger.info("Document metadata stored for user %s, doc: %s", user_email, document_id)
  return True
  
  except Exception as e:
- logger.error(f"Error storing document metadata: {str(e)}")
+ logger.error("Error storing document metadata: %s", e)
  return False
 
  async def get_user_documents(self, user_email: str, limit: int = 50, offset: int = 0) -> List[Dict]:
@@ -290,7 +293,7 @@ class FirestoreService:
  if limit > 0:
  query = query.limit(limit)
  
- docs = query.stream()
+ docs = await asyncio.to_thread(lambda: list(query.stream()))
  
  documents = []
  for doc in docs:
@@ -298,11 +301,11 @@ class FirestoreService:
  doc_data['id'] = doc.id
  documents.append(doc_data)
  
- logger.info(f"Retrieved {len(documents)} documents for user {user_email} (limit={limit}, offset={offset})")
+ logger.info("Retrieved %d documents for user %s (limit=%d, offset=%d)", len(documents), user_email, limit, offset)
  return documents
  
  except Exception as e:
- logger.error(f"Error getting user documents: {str(e)}")
+ logger.error("Error getting user documents: %s", e)
  return []
 
  async def get_document_metadata(self, user_email: str, document_id: str) -> Optional[Dict]:
@@ -324,7 +327,7 @@ class FirestoreService:
  user_doc_ref = self.db.collection('users').document(user_email)
  doc_ref = user_doc_ref.collection('documents').document(document_id)
  
- doc = doc_ref.get()
+ doc = await asyncio.to_thread(doc_ref.get)
  if doc.exists:
  doc_data = doc.to_dict()
  doc_data['id'] = doc.id
@@ -333,7 +336,7 @@ class FirestoreService:
  return None
  
  except Exception as e:
- logger.error(f"Error getting document metadata: {str(e)}")
+ logger.error("Error getting document metadata: %s", e)
  return None
 
  async def delete_document(self, user_email: str, document_id: str) -> bool:
@@ -355,12 +358,12 @@ class FirestoreService:
  user_doc_ref = self.db.collection('users').document(user_email)
  doc_ref = user_doc_ref.collection('documents').document(document_id)
  
- doc_ref.delete()
- logger.info(f"Document {document_id} deleted for user {user_email}")
+ await asyncio.to_thread(doc_ref.delete)
+ logger.info("Document %s deleted for user %s", document_id, user_email)
  return True
  
  except Exception as e:
- logger.error(f"Error deleting document metadata: {str(e)}")
+ logger.error("Error deleting document metadata: %s", e)
  return False
 
 
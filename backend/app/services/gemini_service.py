@@ -12,20 +12,70 @@ Upgraded to Gemini 3 SDK (google-genai) with support for:
 - Code Execution for visual document analysis
 """
 
+import asyncio
+import hashlib
+import io
 import logging
+import random
+import time
 import re
-import json
 import base64
-from typing import List, Dict, Optional, Any
+
+import orjson
+from typing import List, Dict, Optional, Any, AsyncIterator, Tuple, Union
+from collections import OrderedDict, deque
 from pydantic import BaseModel, Field
 
 from google import genai
 from google.genai import types
+from google.genai import errors as genai_errors
 
 from app.config.settings import get_settings
+from app.services.llm_cache import LLMResponseCache, get_llm_cache
 
 logger = logging.getLogger(__name__)
 
+# Compiled once at import; _clean_gemini_response runs on every generate
+# path. The passes stay sequential on purpose: bold must be stripped before
+# italics so nested emphasis unwraps, and heading hashes can appear around
+# already-unwrapped text. Fusing them into one alternation changes output.
+_MD_BOLD_RE = re.compile(r'\*\*(.*?)\*\*')
+_MD_ITALIC_RE = re.compile(r'\*(.*?)\*')
+_MD_CODE_RE = re.compile(r'`(.*?)`')
+_MD_HASH_RE = re.compile(r'#{1,6}\s*')
+_BLANK_RE = re.compile(r'\n\s*\n')
+_DEF_PREFIX_RE = re.compile(r'^(Definition:|Term:|Legal term:|Answer:)\s*', re.IGNORECASE)
+_WORD_RE = re.compile(r'\S+')
+
+# One SDK client per process. GeminiService is normally a singleton via
+# get_gemini_service(), but any stray direct construction still reuses the
+# same client and its underlying connection pool instead of re-handshaking.
+_shared_client: Optional[genai.Client] = None
+
+def _get_shared_client(api_key: str) -> genai.Client:
+ global _shared_client
+ if _shared_client is None:
+ _shared_client = genai.Client(api_key=api_key)
+ return _shared_client
+
+def _count_words(text: str) -> int:
+ """Count words without materializing the full token list str.split builds."""
+ return sum(1 for _ in _WORD_RE.finditer(text))
+
+def _chunk_paragraphs(text: str, max_chars: int):
+ """Split text into chunks of at most ~max_chars on paragraph boundaries."""
+ buf: List[str] = []
+ size = 0
+ for para in text.split('\n\n'):
+ if buf and size + len(para) > max_chars:
+ yield '\n\n'.join(buf)
+ buf = [para]
+ size = len(para)
+ else:
+ buf.append(para)
+ size += len(para) + 2
+ if buf:
+ yield '\n\n'.join(buf)
 
 # --- Structured Output Schemas (Pydantic) ---
 
@@ -65,6 +115,23 @@ class ApplicableLawsSchema(BaseModel):
  """Schema for list of applicable laws."""
  laws: List[ApplicableLawSchema] = Field(description="List of applicable laws")
 
+class TermListSchema(BaseModel):
+ """Schema for a bare list of complex legal terms."""
+ terms: List[str] = Field(description="Complex legal terms found in the text")
+
+class ComprehensiveSimplificationSchema(BaseModel):
+ """Schema for combined simplification and term extraction."""
+ simplified_text: str = Field(description="The simplified rewrite of the document")
+ complex_terms: List[LegalTermSchema] = Field(description="Complex terms from the original text with simple explanations")
+
+# JSON schemas computed once at import - model_json_schema() walks the whole
+# model graph and builds a fresh dict on every call otherwise.
+_TERMS_SCHEMA = LegalTermsExtractionSchema.model_json_schema()
+_RISK_SCHEMA = RiskAnalysisSchema.model_json_schema()
+_LAWS_SCHEMA = ApplicableLawsSchema.model_json_schema()
+_TERM_LIST_SCHEMA = TermListSchema.model_json_schema()
+_COMPREHENSIVE_SCHEMA = ComprehensiveSimplificationSchema.model_json_schema()
+
 
 # --- Thinking Level Presets ---
 
@@ -81,6 +148,151 @@ class ThinkingPreset:
  HIGH = types.ThinkingConfig(thinking_level="high")
 
 
+# --- Static Prompt Preambles (shared across invocations, context-cacheable) ---
+#
+# Gemini's implicit prompt caching keys on the longest byte-identical prefix,
+# so each template keeps its static instructions first and appends the dynamic
+# payload strictly at the tail.
+
+EXTRACT_TERMS_INSTRUCTIONS = """Analyze the following legal text and identify complex legal terms, jargon, and phrases that would be difficult for a layperson to understand.
+
+Focus on:
+- Legal terminology and jargon
+- Latin phrases commonly used in law
+- Technical legal concepts
+- Complex procedural terms
+- Legal obligations and conditions
+- Formal legal language that could be simplified
+
+Return only the complex terms, without any explanations or additional text.
+
+Text to analyze:"""
+
+TERM_DEFINITION_INSTRUCTIONS = """Provide a clear, simple definition for the given legal term in the context of the following text.
+
+The definition should be:
+- Easy to understand for a layperson
+- Concise (1-2 sentences maximum)
+- Relevant to the specific context provided
+- Written in plain English"""
+
+STANDALONE_DEFINITION_INSTRUCTIONS = """You are a legal expert. Provide a clear, accurate definition for the given legal term.
+
+Requirements for the definition:
+- Must be legally accurate and authoritative
+- Written in clear, simple language that non-lawyers can understand
+- Include the main legal meaning and practical application
+- 2-3 sentences maximum
+- Focus on the most common legal usage"""
+
+MULTI_TERM_INSTRUCTIONS = """Provide clear, simple definitions for the following legal terms in the context of the provided text.
+
+For each term, provide:
+- A definition that is easy to understand for a layperson
+- Concise explanation (1-2 sentences maximum)
+- Relevant to the specific context provided
+- Written in plain English"""
+
+EXTRACT_STRUCTURED_TEMPLATE = """Extract {max_terms} key legal terms from this document that are critical to understanding obligations. For each term, provide a one-line simple definition in maximum 15 words.
+
+Document:
+{document}
+
+Focus on terms that appear in the document and are critical to understanding obligations."""
+
+SIMPLIFY_INSTRUCTIONS = """Rewrite the following legal text in simple, clear language that anyone can understand.
+
+Guidelines:
+- Use everyday language instead of legal jargon
+- Break down complex sentences into shorter ones
+- Explain legal concepts in plain terms
+- Maintain the original meaning and intent
+- Make it accessible to someone without legal background"""
+
+COMPREHENSIVE_INSTRUCTIONS = """Analyze and simplify the following legal document. Your task has two parts:
+
+PART 1 - SIMPLIFIED TEXT:
+Rewrite the text in simple, clear language that:
+- Uses significantly FEWER words than the original (aim for 40-60% of original length)
+- Uses everyday language instead of legal jargon
+- Breaks down complex sentences into shorter ones
+- Maintains all essential meaning and key information
+- Is accessible to someone without legal background
+- Summarizes efficiently while preserving important details
+
+PART 2 - COMPLEX TERMS:
+Identify the most complex legal terms, jargon, and phrases from the ORIGINAL text that would be difficult for a layperson to understand. For each term, provide a simple explanation."""
+
+
+class _DefinitionBatcher:
+ """
+ Coalesces bursts of single-term definition requests into one call.
+
+ The term-hover UI fires 5-20 one-term lookups within ~100ms of each
+ other; buffering them briefly and issuing a single
+ get_multiple_terms_definitions call amortizes the shared prompt and
+ round-trip cost across the whole burst.
+ """
+
+ def __init__(self, service: "GeminiService", max_batch_size: int = 20, max_wait_ms: int = 50):
+ self._service = service
+ self._max_batch_size = max_batch_size
+ self._max_wait = max_wait_ms / 1000.0
+ # term -> (context, [futures awaiting that term])
+ self._pending: Dict[str, tuple] = {}
+ self._flush_handle = None
+
+ async def request(self, term: str, context: str) -> Optional[str]:
+ """Queue a term lookup and wait for the batched result."""
+ loop = asyncio.get_running_loop()
+ future = loop.create_future()
+
+ entry = self._pending.get(term)
+ if entry is not None:
+ entry[1].append(future)
+ else:
+ self._pending[term] = (context, [future])
+
+ if len(self._pending) >= self._max_batch_size:
+ if self._flush_handle is not None:
+ self._flush_handle.cancel()
+ self._flush_handle = None
+ asyncio.ensure_future(self._flush())
+ elif self._flush_handle is None:
+ self._flush_handle = loop.call_later(
+ self._max_wait,
+ lambda: asyncio.ensure_future(self._flush()),
+ )
+
+ return await future
+
+ async def _flush(self) -> None:
+ """Resolve all queued lookups with one multi-term call."""
+ if self._flush_handle is not None:
+ self._flush_handle.cancel()
+ self._flush_handle = None
+
+ pending, self._pending = self._pending, {}
+ if not pending:
+ return
+
+ terms = list(pending)
+ # Bursts come from hovering over one document, so the first queued
+ # context stands in for the batch.
+ shared_context = next(iter(pending.values()))[0]
+
+ try:
+ definitions = await self._service.get_multiple_terms_definitions(terms, shared_context)
+ except Exception as e:
+ logger.error(f"Batched definition flush failed: {str(e)}")
+ definitions = {}
+
+ for term, (_, futures) in pending.items():
+ for future in futures:
+ if not future.done():
+ future.set_result(definitions.get(term))
+
+
 class GeminiService:
  """
  Service for interacting with Gemini 3 AI for legal processing.
@@ -96,31 +308,118 @@ class GeminiService:
  MODEL_FLASH = "gemini-3-flash-preview"
  MODEL_IMAGE = "gemini-3-pro-image-preview"
 
+ # Rough chars-per-token ratio for legal English; converts token budgets
+ # into character windows without paying a count_tokens round trip.
+ _CHARS_PER_TOKEN = 4
+
+ # Retry/backoff and circuit-breaker tuning for transient API failures
+ _RETRY_ATTEMPTS = 4
+ _RETRY_BASE_DELAY = 0.5
+ _RETRY_MAX_DELAY = 16.0
+ _RETRYABLE_CODES = (429, 500, 502, 503, 504)
+ _BREAKER_FAIL_MAX = 20
+ _BREAKER_RESET_SECONDS = 30.0
+
+ # How many Files API handles to keep for repeated image analysis
+ _FILE_CACHE_SIZE = 256
+
+ # Explicit per-document context caches: entries below the server's
+ # ~2048-token minimum are not cacheable, so short docs skip the API call
+ _DOC_CACHE_SIZE = 64
+ _DOC_CACHE_MIN_CHARS = 2048 * _CHARS_PER_TOKEN
+ _DOC_CACHE_TTL_SECONDS = 600
+
+ # Documents above twice this size are split on paragraph boundaries
+ # and simplified concurrently, then merged
+ _CHUNK_MAX_CHARS = 8000
+
+ # Static request configs, built once at class creation. _make_config
+ # allocates a kwargs dict and validates a fresh GenerateContentConfig on
+ # every call; these cover the fixed combinations the hot paths use.
+ _CFG_LOW = types.GenerateContentConfig(temperature=1.0, thinking_config=ThinkingPreset.LOW)
+ _CFG_MEDIUM = types.GenerateContentConfig(temperature=1.0, thinking_config=ThinkingPreset.MEDIUM)
+ _CFG_HIGH = types.GenerateContentConfig(temperature=1.0, thinking_config=ThinkingPreset.HIGH)
+ _CFG_HIGH_SEARCH = types.GenerateContentConfig(
+ temperature=1.0,
+ thinking_config=ThinkingPreset.HIGH,
+ tools=[{"google_search": {}}],
+ )
+
  def __init__(self):
  self.settings = get_settings()
- api_key = self.settings.GEMINI_API_KEY
+ self._api_key = self.settings.GEMINI_API_KEY
+ self._client_alpha = None
 
- if not api_key:
+ if not self._api_key:
  logger.warning("GEMINI_API_KEY not set - Gemini service will not function")
  self.client = None
- self.client_alpha = None
  return
 
- # Standard client for most operations
- self.client = genai.Client(api_key=api_key)
+ # Standard client for most operations (shared across instances)
+ self.client = _get_shared_client(self._api_key)
 
- # Alpha client for media_resolution support (currently v1alpha only)
- self.client_alpha = genai.Client(
- api_key=api_key,
- http_options={"api_version": "v1alpha"}
- )
+ # LRU of Files API handles keyed by content hash, so re-analysing the
+ # same page image reuses one upload instead of re-sending the bytes
+ self._file_handles: "OrderedDict[str, types.File]" = OrderedDict()
+
+ # Debouncer that folds bursts of single-term lookups into one call
+ self._definition_batcher = _DefinitionBatcher(self)
+
+ # Circuit-breaker state: consecutive failures and when the breaker opened
+ self._breaker_failures = 0
+ self._breaker_opened_at = 0.0
+
+ # Lazily created explicit context caches for static prompt preambles
+ self._prompt_caches: Dict[str, str] = {}
+ self._prompt_cache_expiry: Dict[str, float] = {}
+
+ # Explicit context caches for recently analyzed documents, keyed by
+ # content hash: (cached_content handle, expiry timestamp)
+ self._doc_caches: "OrderedDict[str, tuple]" = OrderedDict()
+
+ # Cap concurrent in-flight Gemini calls so fan-out paths (multi-term
+ # definitions, parallel analysis pipelines) can't overwhelm the API quota.
+ self._request_semaphore = asyncio.Semaphore(self.settings.GEMINI_MAX_CONCURRENCY)
+
+ # Sliding-window QPM limiter: timestamps of requests in the last
+ # minute. Staying under the quota is much cheaper than eating 429s
+ # and re-serialising a fan-out through the retry path.
+ self._request_times: deque = deque()
+ self._rate_lock = asyncio.Lock()
 
  logger.info("Gemini 3 service initialized with Pro, Flash, and Image models")
 
+ @property
+ def client_alpha(self):
+ """
+ Alpha client for media_resolution support (currently v1alpha only).
+ Created lazily - only the image OCR path needs it, and each client
+ carries its own HTTP connection pool.
+ """
+ if self._client_alpha is None and self._api_key:
+ self._client_alpha = genai.Client(
+ api_key=self._api_key,
+ http_options={"api_version": "v1alpha"}
+ )
+ return self._client_alpha
+
  # ------------------------------------------------------------------
  # FEATURE: Thinking Levels
  # ------------------------------------------------------------------
 
+ @staticmethod
+ def _trim_to_tokens(text: str, max_tokens: int) -> str:
+ """
+ Trim text to approximately max_tokens, cutting at a word boundary so
+ no token is split mid-way. Character slices like text[:4000] both
+ under-fill the model window and can cut through multi-byte content.
+ """
+ limit = max_tokens * GeminiService._CHARS_PER_TOKEN
+ if len(text) <= limit:
+ return text
+ cut = text.rfind(' ', 0, limit)
+ return text[:cut] if cut > 0 else text[:limit]
+
  def _make_config(
  self,
  thinking: types.ThinkingConfig = None,
@@ -128,6 +427,7 @@ class GeminiService:
  tools: list = None,
  response_mime_type: str = None,
  response_schema: Any = None,
+ cached_content: str = None,
  ) -> types.GenerateContentConfig:
  """
  Build a GenerateContentConfig with Gemini 3 parameters.
@@ -143,9 +443,153 @@ class GeminiService:
  kwargs["response_mime_type"] = response_mime_type
  if response_schema:
  kwargs["response_json_schema"] = response_schema
+ if cached_content:
+ kwargs["cached_content"] = cached_content
 
  return types.GenerateContentConfig(**kwargs)
 
+ async def _generate_content(self, model: str, contents: Any, config: types.GenerateContentConfig, client: genai.Client = None):
+ """
+ Run a generation call on the native async client surface.
+
+ All generation goes through here so one place owns the concurrency
+ cap, retry-with-jitter on transient 429/5xx errors, and the circuit
+ breaker that fails fast during an outage instead of letting every
+ caller pile retries onto a struggling endpoint.
+ """
+ client = client or self.client
+
+ # Fail fast while the breaker is open so retries don't amplify an outage
+ if self._breaker_failures >= self._BREAKER_FAIL_MAX:
+ if time.time() - self._breaker_opened_at < self._BREAKER_RESET_SECONDS:
+ raise RuntimeError("Gemini circuit breaker open - failing fast")
+ self._breaker_failures = 0
+
+ delay = self._RETRY_BASE_DELAY
+ for attempt in range(self._RETRY_ATTEMPTS):
+ try:
+ await self._acquire_rate_slot()
+ async with self._request_semaphore:
+ response = await client.aio.models.generate_content(
+ model=model,
+ contents=contents,
+ config=config,
+ )
+ self._breaker_failures = 0
+ return response
+
+ except genai_errors.APIError as e:
+ self._breaker_failures += 1
+ self._breaker_opened_at = time.time()
+ retryable = getattr(e, 'code', None) in self._RETRYABLE_CODES
+ if not retryable or attempt == self._RETRY_ATTEMPTS - 1:
+ raise
+ # Exponential backoff with full jitter so concurrent callers
+ # don't retry in lockstep (thundering herd)
+ await asyncio.sleep(random.uniform(0, min(delay, self._RETRY_MAX_DELAY)))
+ delay *= 2
+
+ async def _acquire_rate_slot(self) -> None:
+ """Block until a request can start without exceeding GEMINI_QPM."""
+ qpm = self.settings.GEMINI_QPM
+ if qpm <= 0:
+ return
+ while True:
+ async with self._rate_lock:
+ now = time.monotonic()
+ while self._request_times and now - self._request_times[0] >= 60.0:
+ self._request_times.popleft()
+ if len(self._request_times) < qpm:
+ self._request_times.append(now)
+ return
+ wait = 60.0 - (now - self._request_times[0])
+ logger.debug("QPM limit reached, sleeping %.1fs", wait)
+ await asyncio.sleep(wait)
+
+ async def _get_prompt_cache(self, name: str, static_prompt: str, model: str) -> Optional[str]:
+ """
+ Lazily create (and refresh) an explicit Gemini context cache for a
+ static instruction preamble. Cached prefixes are billed at a
+ discounted rate and the server reuses the KV prefill.
+
+ Returns the cached_content handle, or None when the cache cannot be
+ created (e.g. preamble below the server minimum token count) - the
+ caller then falls back to inlining the preamble.
+ """
+ # Preambles below the server's ~2048-token cache minimum can never be
+ # cached; skip the doomed create round-trip entirely instead of paying
+ # it once every negative-cache window
+ if len(static_prompt) < self._DOC_CACHE_MIN_CHARS:
+ return None
+ 
+ now = time.time()
+ if now < self._prompt_cache_expiry.get(name, 0):
+ # Either a live handle, or None while caching is known-unavailable
+ return self._prompt_caches.get(name)
+
+ try:
+ cached = await self.client.aio.caches.create(
+ model=model,
+ config=types.CreateCachedContentConfig(
+ contents=[static_prompt],
+ ttl="3600s",
+ ),
+ )
+ self._prompt_caches[name] = cached.name
+ # Refresh slightly before the server-side TTL lapses
+ self._prompt_cache_expiry[name] = now + 3300
+ return cached.name
+
+ except Exception as e:
+ logger.debug("Context cache unavailable for %s: %s", name, e)
+ self._prompt_caches.pop(name, None)
+ # Avoid re-attempting creation on every single call
+ self._prompt_cache_expiry[name] = now + 600
+ return None
+
+ async def _get_or_create_doc_cache(self, text: str) -> Optional[str]:
+ """
+ Get (or create) an explicit context cache holding a document body.
+
+ The same document is often re-analyzed shortly after upload
+ (simplify, then re-extract terms, then Q&A); caching the document as
+ a prefix means follow-up calls resend only the short instruction turn
+ while the server reuses the prefill at the discounted cached-token
+ rate. Documents under the server's ~2048-token cache minimum return
+ None and take the direct path.
+ """
+ if len(text) < self._DOC_CACHE_MIN_CHARS:
+ return None
+
+ key = hashlib.sha256(text.encode('utf-8')).hexdigest()
+ now = time.time()
+
+ entry = self._doc_caches.get(key)
+ if entry is not None:
+ handle, expiry = entry
+ if now < expiry:
+ self._doc_caches.move_to_end(key)
+ return handle
+ del self._doc_caches[key]
+
+ try:
+ cached = await self.client.aio.caches.create(
+ model=self.MODEL_FLASH,
+ config=types.CreateCachedContentConfig(
+ contents=[text],
+ ttl=f"{self._DOC_CACHE_TTL_SECONDS}s",
+ ),
+ )
+ except Exception as e:
+ logger.debug("Document context cache unavailable: %s", e)
+ return None
+
+ # Expire locally a bit before the server does
+ self._doc_caches[key] = (cached.name, now + self._DOC_CACHE_TTL_SECONDS - 30)
+ if len(self._doc_caches) > self._DOC_CACHE_SIZE:
+ self._doc_caches.popitem(last=False)
+ return cached.name
+
  # ------------------------------------------------------------------
  # Term Extraction (Flash + Low Thinking)
  # ------------------------------------------------------------------
@@ -153,47 +597,43 @@ class GeminiService:
  async def extract_complex_legal_terms(self, text: str) -> List[str]:
  """
  Extract complex legal terms using Gemini 3 Flash with low thinking.
- Fast extraction for UI responsiveness.
+
+ Deprecated: prefer extract_terms_structured, which returns terms AND
+ definitions in one structured call - pairing this with a follow-up
+ definition call sends the document twice for no benefit.
  """
  if not self.client:
  return []
 
  try:
- prompt = f"""Analyze the following legal text and identify complex legal terms, jargon, and phrases that would be difficult for a layperson to understand.
-
-Focus on:
-- Legal terminology and jargon
-- Latin phrases commonly used in law
-- Technical legal concepts
-- Complex procedural terms
-- Legal obligations and conditions
-- Formal legal language that could be simplified
+ prompt = f"{EXTRACT_TERMS_INSTRUCTIONS}\n{text}"
 
-Return only the complex terms as a comma-separated list, without any explanations or additional text.
+ cache = get_llm_cache()
+ cache_key = LLMResponseCache.make_key(self.MODEL_FLASH, "low", prompt)
+ cached = cache.get(cache_key)
+ if cached is not None:
+ return cached
 
-Text to analyze:
-{text}
-
-Complex legal terms:"""
-
- config = self._make_config(thinking=ThinkingPreset.LOW)
+ config = self._make_config(
+ thinking=ThinkingPreset.LOW,
+ response_mime_type="application/json",
+ response_schema=_TERM_LIST_SCHEMA,
+ )
 
- response = self.client.models.generate_content(
+ response = await self._generate_content(
  model=self.MODEL_FLASH,
  contents=prompt,
  config=config,
  )
 
  if response.text:
- terms_text = response.text.strip()
- terms = [term.strip() for term in terms_text.split(',') if term.strip()]
- cleaned_terms = []
- for term in terms:
- cleaned_term = term.strip('"\'.,;')
- if cleaned_term and len(cleaned_term) > 1:
- cleaned_terms.append(cleaned_term)
+ cleaned_terms = [
+ term.strip() for term in orjson.loads(response.text).get('terms', [])
+ if term.strip() and len(term.strip()) > 1
+ ]
 
  logger.info(f"Extracted {len(cleaned_terms)} complex legal terms via Gemini 3 Flash")
+ cache.set(cache_key, cleaned_terms, ttl=self.settings.LLM_CACHE_TTL_CONTEXT)
  return cleaned_terms
 
  return []
@@ -215,13 +655,7 @@ Complex legal terms:"""
  if "Please provide a clear legal definition" in context:
  return await self.get_standalone_legal_definition(term)
 
- prompt = f"""Provide a clear, simple definition for the legal term "{term}" in the context of the following text.
-
-The definition should be:
-- Easy to understand for a layperson
-- Concise (1-2 sentences maximum)
-- Relevant to the specific context provided
-- Written in plain English
+ prompt = f"""{TERM_DEFINITION_INSTRUCTIONS}
 
 Context:
 {context}
@@ -230,9 +664,9 @@ Term to define: {term}
 
 Definition:"""
 
- config = self._make_config(thinking=ThinkingPreset.LOW)
+ config = self._CFG_LOW
 
- response = self.client.models.generate_content(
+ response = await self._generate_content(
  model=self.MODEL_FLASH,
  contents=prompt,
  config=config,
@@ -240,7 +674,7 @@ Definition:"""
 
  if response.text:
  definition = response.text.strip()
- definition = re.sub(r'^(Definition:|Term:|Answer:)\s*', '', definition, flags=re.IGNORECASE)
+ definition = _DEF_PREFIX_RE.sub('', definition)
  return definition.strip()
 
  return None
@@ -249,28 +683,38 @@ Definition:"""
  logger.error(f"Error getting definition for term '{term}': {str(e)}")
  return None
 
+ async def get_term_definition_batched(self, term: str, context: str) -> Optional[str]:
+ """
+ Like get_term_definition, but coalesces concurrent callers into one
+ batched request. Use for interactive bursts (term hover); latency is
+ at most ~50ms worse than a lone call and far better under load.
+ """
+ if not self.client:
+ return None
+
+ return await self._definition_batcher.request(term, context)
+
  async def get_standalone_legal_definition(self, term: str) -> Optional[str]:
  """Get a standalone legal definition using Gemini 3 Flash."""
  if not self.client:
  return None
 
  try:
- prompt = f"""You are a legal expert. Provide a clear, accurate definition for the legal term "{term}".
-
-Requirements for the definition:
-- Must be legally accurate and authoritative
-- Written in clear, simple language that non-lawyers can understand
-- Include the main legal meaning and practical application
-- 2-3 sentences maximum
-- Focus on the most common legal usage
+ prompt = f"""{STANDALONE_DEFINITION_INSTRUCTIONS}
 
 Legal term: {term}
 
 Definition:"""
 
- config = self._make_config(thinking=ThinkingPreset.LOW)
+ cache = get_llm_cache()
+ cache_key = LLMResponseCache.make_key(self.MODEL_FLASH, "low", prompt)
+ cached = cache.get(cache_key)
+ if cached is not None:
+ return cached
+
+ config = self._CFG_LOW
 
- response = self.client.models.generate_content(
+ response = await self._generate_content(
  model=self.MODEL_FLASH,
  contents=prompt,
  config=config,
@@ -278,8 +722,10 @@ Definition:"""
 
  if response.text:
  definition = response.text.strip()
- definition = re.sub(r'^(Definition:|Legal term:|Answer:)\s*', '', definition, flags=re.IGNORECASE)
- return definition.strip()
+ definition = _DEF_PREFIX_RE.sub('', definition)
+ definition = definition.strip()
+ cache.set(cache_key, definition, ttl=self.settings.LLM_CACHE_TTL_STANDALONE)
+ return definition
 
  return None
 
@@ -287,56 +733,78 @@ Definition:"""
  logger.error(f"Error getting standalone definition for '{term}': {str(e)}")
  return None
 
- async def get_multiple_terms_definitions(self, terms: List[str], context: str) -> Dict[str, str]:
- """Get definitions for multiple terms in a single API call using Flash."""
- if not self.client or not terms:
+ async def get_definitions_bulk(self, items: List[tuple]) -> Dict[str, Optional[str]]:
+ """
+ Look up definitions for many (term, context) pairs concurrently.
+
+ Fires one request per item via asyncio.gather so the total latency is
+ the slowest round trip, not the sum; the shared semaphore keeps the
+ fan-out within the configured concurrency cap. Prefer
+ get_multiple_terms_definitions when all terms share one context -
+ a single prompt beats N calls.
+ """
+ if not self.client or not items:
  return {}
 
- try:
- terms_list = "\n".join([f"- {term}" for term in terms])
+ results = await asyncio.gather(
+ *[self.get_term_definition(term, context) for term, context in items],
+ return_exceptions=True,
+ )
 
- prompt = f"""Provide clear, simple definitions for the following legal terms in the context of the provided text.
+ definitions: Dict[str, Optional[str]] = {}
+ for (term, _), result in zip(items, results):
+ if isinstance(result, Exception):
+ logger.error(f"Bulk definition lookup failed for '{term}': {result}")
+ definitions[term] = None
+ else:
+ definitions[term] = result
+ return definitions
 
-For each term, provide:
-- A definition that is easy to understand for a layperson
-- Concise explanation (1-2 sentences maximum)
-- Relevant to the specific context provided
-- Written in plain English
+ async def get_multiple_terms_definitions(self, terms: List[str], context: str) -> Dict[str, str]:
+ """
+ Get definitions for multiple terms in a single structured API call.
 
-Format your response as:
-Term1: Definition1
-Term2: Definition2
+ Uses the structured-output schema so the response is guaranteed JSON -
+ the old line-by-line term:definition parser silently dropped any line
+ the model formatted differently.
 
-Context:
-{context}
+ For latency-sensitive callers, get_definitions_bulk fans the same
+ lookup out as one short concurrent request per term; wall time is
+ then max(latency) instead of one large generation, at the cost of N
+ prompt overheads.
+ """
+ if not self.client or not terms:
+ return {}
 
-Legal terms to define:
-{terms_list}
+ try:
+ terms_list = "\n".join([f"- {term}" for term in terms])
 
-Definitions:"""
+ prompt = f"{MULTI_TERM_INSTRUCTIONS}\n\nContext:\n{context}\n\nLegal terms to define:\n{terms_list}"
 
- config = self._make_config(thinking=ThinkingPreset.LOW)
+ config = self._make_config(
+ thinking=ThinkingPreset.LOW,
+ response_mime_type="application/json",
+ response_schema=_TERMS_SCHEMA,
+ )
 
- response = self.client.models.generate_content(
+ response = await self._generate_content(
  model=self.MODEL_FLASH,
  contents=prompt,
  config=config,
  )
 
  if response.text:
- definitions = {}
- lines = response.text.strip().split('\n')
- for line in lines:
- if ':' in line:
- parts = line.split(':', 1)
- if len(parts) == 2:
- term = parts[0].strip().strip('-').strip()
- definition = parts[1].strip()
- for original_term in terms:
- if term.lower() == original_term.lower():
- definitions[original_term] = definition
- break
- return definitions
+ # Schema is enforced server-side via response_json_schema, so a
+ # plain JSON parse avoids the Pydantic validate + re-dump walk.
+ by_lower = {
+ t['term'].lower(): t['definition']
+ for t in orjson.loads(response.text).get('terms', [])
+ }
+ return {
+ original_term: by_lower[original_term.lower()]
+ for original_term in terms
+ if original_term.lower() in by_lower
+ }
 
  return {}
 
@@ -357,28 +825,33 @@ Definitions:"""
  return []
 
  try:
- prompt = f"""Extract {max_terms} key legal terms from this document that are critical to understanding obligations. For each term, provide a one-line simple definition in maximum 15 words.
+ prompt = EXTRACT_STRUCTURED_TEMPLATE.format_map({
+ 'max_terms': max_terms,
+ 'document': self._trim_to_tokens(text, 28000),
+ })
 
-Document:
-{text[:4000]}
-
-Focus on terms that appear in the document and are critical to understanding obligations."""
+ cache = get_llm_cache()
+ cache_key = LLMResponseCache.make_key(self.MODEL_FLASH, "low", prompt, schema="LegalTermsExtractionSchema")
+ cached = cache.get(cache_key)
+ if cached is not None:
+ return cached
 
  config = self._make_config(
  thinking=ThinkingPreset.LOW,
  response_mime_type="application/json",
- response_schema=LegalTermsExtractionSchema.model_json_schema(),
+ response_schema=_TERMS_SCHEMA,
  )
 
- response = self.client.models.generate_content(
+ response = await self._generate_content(
  model=self.MODEL_FLASH,
  contents=prompt,
  config=config,
  )
 
  if response.text:
- result = LegalTermsExtractionSchema.model_validate_json(response.text)
- return [{"term": t.term, "definition": t.definition} for t in result.terms]
+ terms = orjson.loads(response.text).get('terms', [])
+ cache.set(cache_key, terms)
+ return terms
 
  return []
 
@@ -390,16 +863,9 @@ Focus on terms that appear in the document and are critical to understanding obl
  # FEATURE: Risk Analysis (Pro + High Thinking + Structured Output)
  # ------------------------------------------------------------------
 
- async def analyze_risk_structured(self, text: str) -> Dict[str, Any]:
- """
- Perform risk analysis using Gemini 3 Pro with high thinking level
- and structured JSON output. Returns guaranteed structured data.
- """
- if not self.client:
- return {}
-
- try:
- prompt = f"""You are a professional legal document analyzer specializing in Indian law. Analyze this document for risks.
+ def _build_risk_prompt(self, text: str) -> str:
+ """Build the risk-analysis prompt (shared by interactive and batch paths)."""
+ return f"""You are a professional legal document analyzer specializing in Indian law. Analyze this document for risks.
 
 For each risky clause, identify:
 - The clause reference
@@ -414,21 +880,48 @@ a financial risk summary, and top recommendations.
 Document:
 {text}"""
 
+ def _build_laws_prompt(self, text: str) -> str:
+ """Build the law-identification prompt (shared by interactive and batch paths)."""
+ return f"""Identify 8-12 relevant Indian laws for this legal document. For each law provide the full Act name with year, specific section numbers, how it applies to this document, and key compliance requirements.
+
+Focus on current Indian laws including BNS, BNSS, BSA, Consumer Protection Act 2019, Transfer of Property Act 1882, Registration Act 1908, Indian Contract Act 1872, and any other relevant legislation.
+
+Document:
+{self._trim_to_tokens(text, 24000)}"""
+
+ async def analyze_risk_structured(self, text: str) -> Dict[str, Any]:
+ """
+ Perform risk analysis using Gemini 3 Pro with high thinking level
+ and structured JSON output. Returns guaranteed structured data.
+ """
+ if not self.client:
+ return {}
+
+ try:
+ prompt = self._build_risk_prompt(text)
+
+ cache = get_llm_cache()
+ cache_key = LLMResponseCache.make_key(self.MODEL_PRO, "high", prompt, schema="RiskAnalysisSchema")
+ cached = cache.get(cache_key)
+ if cached is not None:
+ return cached
+
  config = self._make_config(
  thinking=ThinkingPreset.HIGH,
  response_mime_type="application/json",
- response_schema=RiskAnalysisSchema.model_json_schema(),
+ response_schema=_RISK_SCHEMA,
  )
 
- response = self.client.models.generate_content(
+ response = await self._generate_content(
  model=self.MODEL_PRO,
  contents=prompt,
  config=config,
  )
 
  if response.text:
- result = RiskAnalysisSchema.model_validate_json(response.text)
- return result.model_dump()
+ analysis = orjson.loads(response.text)
+ cache.set(cache_key, analysis)
+ return analysis
 
  return {}
 
@@ -442,36 +935,50 @@ Document:
 
  async def identify_laws_grounded(self, text: str) -> List[Dict[str, str]]:
  """
- Identify applicable laws using Gemini 3 Pro with Google Search grounding.
- The model verifies law citations against real-time search results.
+ Identify applicable laws with Google Search grounding.
+
+ Grounding supplies the authoritative law text, so the default runs
+ Flash with medium thinking instead of Pro with high - the deep
+ chain-of-thought was mostly re-deriving what search already returned,
+ at several times the latency and thinking-token cost. The
+ LAW_ID_MODEL / LAW_ID_THINKING settings restore the heavier config.
  """
  if not self.client:
  return []
 
  try:
- prompt = f"""Identify 8-12 relevant Indian laws for this legal document. For each law provide the full Act name with year, specific section numbers, how it applies to this document, and key compliance requirements.
+ prompt = self._build_laws_prompt(text)
 
-Focus on current Indian laws including BNS, BNSS, BSA, Consumer Protection Act 2019, Transfer of Property Act 1882, Registration Act 1908, Indian Contract Act 1872, and any other relevant legislation.
+ law_model = self.settings.LAW_ID_MODEL
+ law_thinking = self.settings.LAW_ID_THINKING
 
-Document:
-{text[:3000]}"""
+ cache = get_llm_cache()
+ cache_key = LLMResponseCache.make_key(law_model, law_thinking, prompt, schema="ApplicableLawsSchema")
+ cached = cache.get(cache_key)
+ if cached is not None:
+ return cached
 
  config = self._make_config(
- thinking=ThinkingPreset.HIGH,
+ thinking={
+ "low": ThinkingPreset.LOW,
+ "medium": ThinkingPreset.MEDIUM,
+ "high": ThinkingPreset.HIGH,
+ }.get(law_thinking, ThinkingPreset.MEDIUM),
  tools=[{"google_search": {}}],
  response_mime_type="application/json",
- response_schema=ApplicableLawsSchema.model_json_schema(),
+ response_schema=_LAWS_SCHEMA,
  )
 
- response = self.client.models.generate_content(
- model=self.MODEL_PRO,
+ response = await self._generate_content(
+ model=law_model,
  contents=prompt,
  config=config,
  )
 
  if response.text:
- result = ApplicableLawsSchema.model_validate_json(response.text)
- return [law.model_dump() for law in result.laws]
+ laws = orjson.loads(response.text).get('laws', [])
+ cache.set(cache_key, laws)
+ return laws
 
  return []
 
@@ -489,25 +996,22 @@ Document:
  return None
 
  try:
- prompt = f"""Rewrite the following legal text in simple, clear language that anyone can understand.
-
-Guidelines:
-- Use everyday language instead of legal jargon
-- Break down complex sentences into shorter ones
-- Explain legal concepts in plain terms
-- Maintain the original meaning and intent
-- Make it accessible to someone without legal background
-
-Original legal text:
+ user_turn = f"""Original legal text:
 {text}
 
 Simplified version:"""
 
- config = self._make_config(thinking=ThinkingPreset.MEDIUM)
+ cached_handle = await self._get_prompt_cache('simplify', SIMPLIFY_INSTRUCTIONS, self.MODEL_FLASH)
+ if cached_handle:
+ contents = user_turn
+ config = self._make_config(thinking=ThinkingPreset.MEDIUM, cached_content=cached_handle)
+ else:
+ contents = f"{SIMPLIFY_INSTRUCTIONS}\n\n{user_turn}"
+ config = self._CFG_MEDIUM
 
- response = self.client.models.generate_content(
+ response = await self._generate_content(
  model=self.MODEL_FLASH,
- contents=prompt,
+ contents=contents,
  config=config,
  )
 
@@ -519,87 +1023,128 @@ Simplified version:"""
  logger.error(f"Error simplifying legal text: {str(e)}")
  return None
 
- async def comprehensive_simplification(self, text: str) -> Dict[str, Any]:
+ async def simplify_legal_text_stream(self, text: str) -> AsyncIterator[str]:
  """
- Perform comprehensive text simplification with reduced word count and term extraction.
- Uses Gemini 3 Flash with medium thinking for balanced speed and quality.
+ Streaming variant of simplify_legal_text.
+
+ Yields text chunks as they arrive so the first token reaches the
+ client after time-to-first-token instead of full generation time.
  """
  if not self.client:
- return {
- 'simplified_text': text,
- 'complex_terms': {},
- 'original_word_count': len(text.split()) if text else 0,
- 'simplified_word_count': len(text.split()) if text else 0,
- 'reduction_percentage': 0
- }
+ return
 
  try:
- original_word_count = len(text.split())
-
- prompt = f"""Analyze and simplify the following legal document. Your task has two parts:
-
-PART 1 - SIMPLIFIED TEXT:
-Rewrite the text in simple, clear language that:
-- Uses significantly FEWER words than the original (aim for 40-60% of original length)
-- Uses everyday language instead of legal jargon
-- Breaks down complex sentences into shorter ones
-- Maintains all essential meaning and key information
-- Is accessible to someone without legal background
-- Summarizes efficiently while preserving important details
+ user_turn = f"""Original legal text:
+{text}
 
-PART 2 - COMPLEX TERMS:
-Identify the most complex legal terms, jargon, and phrases from the ORIGINAL text that would be difficult for a layperson to understand. For each term, provide a simple explanation and go for new line for each term, bold the term.
+Simplified version:"""
 
-Original text (approximately {original_word_count} words):
-{text}
+ cached_handle = await self._get_prompt_cache('simplify', SIMPLIFY_INSTRUCTIONS, self.MODEL_FLASH)
+ if cached_handle:
+ contents = user_turn
+ config = self._make_config(thinking=ThinkingPreset.MEDIUM, cached_content=cached_handle)
+ else:
+ contents = f"{SIMPLIFY_INSTRUCTIONS}\n\n{user_turn}"
+ config = self._CFG_MEDIUM
 
-Please format your response EXACTLY as follows:
+ await self._acquire_rate_slot()
+ async with self._request_semaphore:
+ stream = await self.client.aio.models.generate_content_stream(
+ model=self.MODEL_FLASH,
+ contents=contents,
+ config=config,
+ )
+ async for chunk in stream:
+ if chunk.text:
+ yield chunk.text
 
-SIMPLIFIED TEXT:
-[Your simplified text here - should be significantly shorter than original]
+ except Exception as e:
+ logger.error(f"Error streaming simplified legal text: {str(e)}")
 
-----COMPLEX TERMS:----
-[term1: simple explanation of term1
-term2: simple explanation of term2
-term3: simple explanation of term3]"""
+ async def generate_response_stream(self, prompt: str, use_pro: bool = False, thinking: str = "low") -> AsyncIterator[str]:
+ """
+ Streaming variant of generate_response; yields cleaned text chunks.
+ """
+ if not self.client:
+ return
 
- config = self._make_config(thinking=ThinkingPreset.MEDIUM)
+ try:
+ config = {
+ "low": self._CFG_LOW,
+ "medium": self._CFG_MEDIUM,
+ "high": self._CFG_HIGH,
+ }.get(thinking, self._CFG_LOW)
+ model = self.MODEL_PRO if use_pro else self.MODEL_FLASH
 
- response = self.client.models.generate_content(
- model=self.MODEL_FLASH,
+ await self._acquire_rate_slot()
+ async with self._request_semaphore:
+ stream = await self.client.aio.models.generate_content_stream(
+ model=model,
  contents=prompt,
  config=config,
  )
+ async for chunk in stream:
+ if chunk.text:
+ yield self._clean_gemini_response(chunk.text)
 
- if response.text:
- response_text = response.text.strip()
- simplified_text = ""
- complex_terms = {}
-
- if "SIMPLIFIED TEXT:" in response_text and "COMPLEX TERMS:" in response_text:
- parts = response_text.split("COMPLEX TERMS:")
- simplified_part = parts[0].replace("SIMPLIFIED TEXT:", "").strip()
- terms_part = parts[1].strip()
- simplified_text = simplified_part
-
- term_lines = terms_part.split('\n')
- for line in term_lines:
- if ':' in line and line.strip():
- term_parts = line.split(':', 1)
- if len(term_parts) == 2:
- term = term_parts[0].strip().strip('[]-')
- definition = term_parts[1].strip()
- complex_terms[term] = definition
-
- simplified_word_count = len(simplified_text.split()) if simplified_text else original_word_count
+ except Exception as e:
+ logger.error(f"GEMINI 3: Streaming response failed: {e}")
 
+ async def comprehensive_simplification(self, text: str) -> Dict[str, Any]:
+ """
+ Perform comprehensive text simplification with reduced word count and term extraction.
+ Uses Gemini 3 Flash with medium thinking for balanced speed and quality.
+ """
+ original_word_count = _count_words(text)
+
+ # Tiny inputs have nothing worth reducing; skip the model round-trip,
+ # which would dominate latency by orders of magnitude.
+ too_short = (
+ original_word_count < self.settings.MIN_SIMPLIFY_WORDS
+ or len(text) < 200
+ )
+ if not self.client or too_short:
  return {
+ 'simplified_text': text,
+ 'complex_terms': {},
+ 'original_word_count': original_word_count,
+ 'simplified_word_count': original_word_count,
+ 'reduction_percentage': 0
+ }
+
+ cache = get_llm_cache()
+ cache_key = LLMResponseCache.make_key(self.MODEL_FLASH, "medium", text, schema="comprehensive_simplification")
+ cached = cache.get(cache_key)
+ if cached is not None:
+ return cached
+
+ try:
+ # Large documents are split on paragraph boundaries and simplified
+ # concurrently: one huge prompt serialises the whole generation and
+ # degrades past the model's comfortable context, while chunks run
+ # in parallel under the concurrency/QPM caps and merge cleanly.
+ if len(text) > self._CHUNK_MAX_CHARS * 2:
+ chunks = list(_chunk_paragraphs(text, self._CHUNK_MAX_CHARS))
+ results = await asyncio.gather(*(self._simplify_chunk(chunk) for chunk in chunks))
+ simplified_text = '\n\n'.join(part for part, _ in results if part).strip()
+ complex_terms: Dict[str, str] = {}
+ for _, terms in results:
+ complex_terms.update(terms)
+ else:
+ simplified_text, complex_terms = await self._simplify_chunk(text)
+
+ if simplified_text:
+ simplified_word_count = _count_words(simplified_text)
+
+ result = {
  'simplified_text': simplified_text,
  'complex_terms': complex_terms,
  'original_word_count': original_word_count,
  'simplified_word_count': simplified_word_count,
  'reduction_percentage': round((1 - simplified_word_count / original_word_count) * 100, 1) if original_word_count > 0 else 0
  }
+ cache.set(cache_key, result, ttl=self.settings.LLM_CACHE_TTL_CONTEXT)
+ return result
 
  return {
  'simplified_text': text,
@@ -614,11 +1159,69 @@ term3: simple explanation of term3]"""
  return {
  'simplified_text': text,
  'complex_terms': {},
- 'original_word_count': len(text.split()) if text else 0,
- 'simplified_word_count': len(text.split()) if text else 0,
+ 'original_word_count': original_word_count,
+ 'simplified_word_count': original_word_count,
  'reduction_percentage': 0
  }
 
+ async def _simplify_chunk(self, text: str) -> Tuple[str, Dict[str, str]]:
+ """Run the comprehensive prompt on one chunk of text.
+
+ Returns (simplified_text, complex_terms); errors propagate to the
+ caller's fallback handling.
+ """
+ word_count = _count_words(text)
+
+ # Large chunks that may be re-analyzed are cached server-side as a
+ # prefix; the instructions then travel as the only dynamic turn.
+ doc_handle = await self._get_or_create_doc_cache(text)
+ if doc_handle:
+ contents = f"{COMPREHENSIVE_INSTRUCTIONS}\n\nThe original text has approximately {word_count} words."
+ config = self._make_config(
+ thinking=ThinkingPreset.MEDIUM,
+ response_mime_type="application/json",
+ response_schema=_COMPREHENSIVE_SCHEMA,
+ cached_content=doc_handle,
+ )
+ else:
+ user_turn = f"""Original text (approximately {word_count} words):
+{text}"""
+
+ cached_handle = await self._get_prompt_cache('comprehensive', COMPREHENSIVE_INSTRUCTIONS, self.MODEL_FLASH)
+ if cached_handle:
+ contents = user_turn
+ config = self._make_config(
+ thinking=ThinkingPreset.MEDIUM,
+ response_mime_type="application/json",
+ response_schema=_COMPREHENSIVE_SCHEMA,
+ cached_content=cached_handle,
+ )
+ else:
+ contents = f"{COMPREHENSIVE_INSTRUCTIONS}\n\n{user_turn}"
+ config = self._make_config(
+ thinking=ThinkingPreset.MEDIUM,
+ response_mime_type="application/json",
+ response_schema=_COMPREHENSIVE_SCHEMA,
+ )
+
+ response = await self._generate_content(
+ model=self.MODEL_FLASH,
+ contents=contents,
+ config=config,
+ )
+
+ if not response.text:
+ return '', {}
+
+ data = orjson.loads(response.text)
+ simplified = data.get('simplified_text', '').strip()
+ terms = {
+ t['term']: t['definition']
+ for t in data.get('complex_terms', [])
+ if t.get('term')
+ }
+ return simplified, terms
+
  # ------------------------------------------------------------------
  # General Response Generation (Flash + configurable thinking)
  # ------------------------------------------------------------------
@@ -638,16 +1241,20 @@ term3: simple explanation of term3]"""
  try:
  logger.info(f"GEMINI 3: Generating response ({len(prompt)} chars, model={'Pro' if use_pro else 'Flash'}, thinking={thinking})")
 
- thinking_config = {
- "low": ThinkingPreset.LOW,
- "medium": ThinkingPreset.MEDIUM,
- "high": ThinkingPreset.HIGH,
- }.get(thinking, ThinkingPreset.LOW)
-
- config = self._make_config(thinking=thinking_config)
+ cache = get_llm_cache()
+ cache_key = LLMResponseCache.make_key(self.MODEL_PRO if use_pro else self.MODEL_FLASH, thinking, prompt)
+ cached = cache.get(cache_key)
+ if cached is not None:
+ return cached
+
+ config = {
+ "low": self._CFG_LOW,
+ "medium": self._CFG_MEDIUM,
+ "high": self._CFG_HIGH,
+ }.get(thinking, self._CFG_LOW)
  model = self.MODEL_PRO if use_pro else self.MODEL_FLASH
 
- response = self.client.models.generate_content(
+ response = await self._generate_content(
  model=model,
  contents=prompt,
  config=config,
@@ -656,6 +1263,7 @@ term3: simple explanation of term3]"""
  if response and response.text:
  cleaned = self._clean_gemini_response(response.text)
  logger.info(f"GEMINI 3: Response generated ({len(cleaned)} chars)")
+ cache.set(cache_key, cleaned, ttl=self.settings.LLM_CACHE_TTL_CONTEXT)
  return cleaned
  else:
  logger.warning("GEMINI 3: Empty response received")
@@ -678,12 +1286,9 @@ term3: simple explanation of term3]"""
  return ""
 
  try:
- config = self._make_config(
- thinking=ThinkingPreset.HIGH,
- tools=[{"google_search": {}}],
- )
+ config = self._CFG_HIGH_SEARCH
 
- response = self.client.models.generate_content(
+ response = await self._generate_content(
  model=self.MODEL_PRO,
  contents=prompt,
  config=config,
@@ -697,11 +1302,34 @@ term3: simple explanation of term3]"""
  logger.error(f"GEMINI 3: Grounded response failed: {e}")
  return ""
 
+ async def _upload_once(self, image_bytes: bytes, mime_type: str) -> types.File:
+ """
+ Upload image bytes through the Files API once and reuse the handle.
+
+ Multi-step visual pipelines (OCR, then visual analysis, then targeted
+ extraction) used to re-send the same multi-MB payload on every call;
+ keying handles by content hash makes the upload O(1) per document.
+ """
+ key = hashlib.sha256(image_bytes).hexdigest()
+ handle = self._file_handles.get(key)
+ if handle is not None:
+ self._file_handles.move_to_end(key)
+ return handle
+
+ handle = await self.client.aio.files.upload(
+ file=io.BytesIO(image_bytes),
+ config=types.UploadFileConfig(mime_type=mime_type),
+ )
+ self._file_handles[key] = handle
+ if len(self._file_handles) > self._FILE_CACHE_SIZE:
+ self._file_handles.popitem(last=False)
+ return handle
+
  # ------------------------------------------------------------------
  # FEATURE: Image OCR with Media Resolution (Flash + v1alpha)
  # ------------------------------------------------------------------
 
- async def extract_text_from_image(self, image_bytes: bytes, mime_type: str) -> str:
+ async def extract_text_from_image(self, image_bytes: Union[bytes, types.File], mime_type: str) -> str:
  """
  Extract text from an image using Gemini 3 Flash with media_resolution_high.
  Uses v1alpha API for media resolution support - captures fine legal text.
@@ -710,6 +1338,8 @@ term3: simple explanation of term3]"""
  return "Gemini API not configured"
 
  try:
+ image_file = image_bytes if isinstance(image_bytes, types.File) else await self._upload_once(image_bytes, mime_type)
+
  contents = [
  types.Content(
  parts=[
@@ -726,9 +1356,9 @@ Instructions:
 
 Provide only the extracted text without any additional commentary."""),
  types.Part(
- inline_data=types.Blob(
+ file_data=types.FileData(
+ file_uri=image_file.uri,
  mime_type=mime_type,
- data=image_bytes,
  ),
  media_resolution={"level": "media_resolution_high"}
  )
@@ -736,12 +1366,13 @@ Provide only the extracted text without any additional commentary."""),
  )
  ]
 
- config = self._make_config(thinking=ThinkingPreset.LOW)
+ config = self._CFG_LOW
 
- response = self.client_alpha.models.generate_content(
+ response = await self._generate_content(
  model=self.MODEL_FLASH,
  contents=contents,
  config=config,
+ client=self.client_alpha,
  )
 
  if response.text:
@@ -799,7 +1430,7 @@ Design requirements:
  )
  )
 
- response = self.client.models.generate_content(
+ response = await self._generate_content(
  model=self.MODEL_IMAGE,
  contents=prompt,
  config=config,
@@ -822,7 +1453,7 @@ Design requirements:
  # FEATURE: Code Execution with Images (Flash + visual analysis)
  # ------------------------------------------------------------------
 
- async def analyze_document_visual(self, image_bytes: bytes, mime_type: str) -> Dict[str, Any]:
+ async def analyze_document_visual(self, image_bytes: Union[bytes, types.File], mime_type: str) -> Dict[str, Any]:
  """
  Analyze a document image using Gemini 3 Flash with code execution.
  The model can zoom, crop, and annotate to extract detailed information.
@@ -831,14 +1462,15 @@ Design requirements:
  return {"error": "Gemini API not configured"}
 
  try:
- image_part = types.Part.from_bytes(data=image_bytes, mime_type=mime_type)
+ image_file = image_bytes if isinstance(image_bytes, types.File) else await self._upload_once(image_bytes, mime_type)
+ image_part = types.Part.from_uri(file_uri=image_file.uri, mime_type=mime_type)
 
  config = self._make_config(
  thinking=ThinkingPreset.HIGH,
  tools=[types.Tool(code_execution=types.ToolCodeExecution)],
  )
 
- response = self.client.models.generate_content(
+ response = await self._generate_content(
  model=self.MODEL_FLASH,
  contents=[
  image_part,
@@ -858,7 +1490,13 @@ Design requirements:
  if hasattr(part, 'code_execution_result') and part.code_execution_result is not None:
  result["code_parts"].append(part.code_execution_result.output)
  if part.inline_data is not None:
- result["images"].append(base64.b64encode(part.inline_data.data).decode())
+ # Base64 of a multi-MB blob stalls the event loop for tens
+ # of milliseconds; run it on a worker thread instead.
+ result["images"].append(
+ await asyncio.to_thread(
+ lambda data=part.inline_data.data: base64.b64encode(data).decode('ascii')
+ )
+ )
 
  return result
 
@@ -866,6 +1504,178 @@ Design requirements:
  logger.error(f"Visual document analysis failed: {e}")
  return {"error": str(e)}
 
+ # ------------------------------------------------------------------
+ # FEATURE: Full-document analysis fan-out
+ # ------------------------------------------------------------------
+
+ async def analyze_document_bundle(self, text: str) -> Dict[str, Any]:
+ """
+ Run term extraction, risk analysis, law identification and
+ comprehensive simplification concurrently on the same document.
+
+ The four calls are independent on the input and hit different model
+ tiers (Flash and Pro have separate rate-limit pools), so total time
+ is the slowest call rather than the sum. Individual failures come
+ back as empty results so callers still get partial analysis.
+ """
+ terms, risk, laws, simplified = await asyncio.gather(
+ self.extract_terms_structured(text),
+ self.analyze_risk_structured(text),
+ self.identify_laws_grounded(text),
+ self.comprehensive_simplification(text),
+ return_exceptions=True,
+ )
+
+ def _or_default(result, default):
+ if isinstance(result, Exception):
+ logger.error(f"Document bundle sub-task failed: {result}")
+ return default
+ return result
+
+ return {
+ 'terms': _or_default(terms, []),
+ 'risk_analysis': _or_default(risk, {}),
+ 'applicable_laws': _or_default(laws, []),
+ 'simplification': _or_default(simplified, {}),
+ }
+
+ # ------------------------------------------------------------------
+ # FEATURE: Batch Mode (offline pipelines, 50% token price)
+ # ------------------------------------------------------------------
+
+ async def submit_batch(self, jobs: List[Dict[str, Any]], model: str = None) -> Optional[str]:
+ """
+ Submit non-interactive jobs through Gemini Batch Mode.
+
+ Batch requests are billed at half the interactive token price and run
+ against a separate rate-limit pool, so offline enrichment (risk
+ analysis, law identification over many documents) should go through
+ here instead of the interactive path.
+
+ Args:
+ jobs: List of {"key": ..., "contents": ..., "config": ...} dicts
+ model: Model to run the batch on (defaults to Pro)
+
+ Returns:
+ The batch job name for polling, or None on failure.
+ """
+ if not self.client or not jobs:
+ return None
+
+ try:
+ batch_job = await self.client.aio.batches.create(
+ model=model or self.MODEL_PRO,
+ src=[
+ {
+ "contents": job["contents"],
+ "config": job.get("config"),
+ }
+ for job in jobs
+ ],
+ )
+ logger.info(f"Submitted Gemini batch job with {len(jobs)} requests: {batch_job.name}")
+ return batch_job.name
+
+ except Exception as e:
+ logger.error(f"Batch submission failed: {str(e)}")
+ return None
+
+ async def poll_batch(self, batch_name: str, poll_interval: float = 30.0, timeout: float = 86400.0) -> Optional[Any]:
+ """
+ Poll a batch job until it reaches a terminal state.
+
+ Returns the finished batch job object, or None on failure/timeout.
+ """
+ if not self.client:
+ return None
+
+ terminal_states = {
+ 'JOB_STATE_SUCCEEDED', 'JOB_STATE_FAILED',
+ 'JOB_STATE_CANCELLED', 'JOB_STATE_EXPIRED',
+ }
+
+ elapsed = 0.0
+ while elapsed < timeout:
+ batch_job = await self.client.aio.batches.get(name=batch_name)
+ if batch_job.state.name in terminal_states:
+ return batch_job
+ await asyncio.sleep(poll_interval)
+ elapsed += poll_interval
+ # Back off gradually; batch jobs typically finish in minutes
+ poll_interval = min(poll_interval * 1.5, 300.0)
+
+ logger.warning(f"Batch job did not finish within {timeout}s: {batch_name}")
+ return None
+
+ def retrieve_batch_results(self, batch_job: Any) -> List[Optional[str]]:
+ """
+ Extract response texts from a finished batch job, in request order.
+ Failed entries come back as None.
+ """
+ results: List[Optional[str]] = []
+ if not batch_job or batch_job.state.name != 'JOB_STATE_SUCCEEDED':
+ return results
+
+ for inline_response in (batch_job.dest.inlined_responses or []):
+ if inline_response.response and inline_response.response.text:
+ results.append(inline_response.response.text)
+ else:
+ results.append(None)
+ return results
+
+ async def analyze_risk_structured_batch(self, texts: List[str]) -> List[Dict[str, Any]]:
+ """Run risk analysis over many documents via Batch Mode."""
+ config = self._make_config(
+ thinking=ThinkingPreset.HIGH,
+ response_mime_type="application/json",
+ response_schema=_RISK_SCHEMA,
+ )
+ jobs = [
+ {"key": str(i), "contents": self._build_risk_prompt(text), "config": config}
+ for i, text in enumerate(texts)
+ ]
+
+ batch_name = await self.submit_batch(jobs, model=self.MODEL_PRO)
+ if not batch_name:
+ return [{} for _ in texts]
+
+ batch_job = await self.poll_batch(batch_name)
+ analyses = []
+ for text in self.retrieve_batch_results(batch_job):
+ try:
+ analyses.append(orjson.loads(text) if text else {})
+ except Exception as e:
+ logger.error(f"Batch risk result parsing failed: {str(e)}")
+ analyses.append({})
+ return analyses
+
+ async def identify_laws_grounded_batch(self, texts: List[str]) -> List[List[Dict[str, str]]]:
+ """Identify applicable laws for many documents via Batch Mode."""
+ config = self._make_config(
+ thinking=ThinkingPreset.HIGH,
+ tools=[{"google_search": {}}],
+ response_mime_type="application/json",
+ response_schema=_LAWS_SCHEMA,
+ )
+ jobs = [
+ {"key": str(i), "contents": self._build_laws_prompt(text), "config": config}
+ for i, text in enumerate(texts)
+ ]
+
+ batch_name = await self.submit_batch(jobs, model=self.MODEL_PRO)
+ if not batch_name:
+ return [[] for _ in texts]
+
+ batch_job = await self.poll_batch(batch_name)
+ all_laws = []
+ for text in self.retrieve_batch_results(batch_job):
+ try:
+ all_laws.append(orjson.loads(text).get('laws', []) if text else [])
+ except Exception as e:
+ logger.error(f"Batch law result parsing failed: {str(e)}")
+ all_laws.append([])
+ return all_laws
+
  # ------------------------------------------------------------------
  # Utility
  # ------------------------------------------------------------------
@@ -875,11 +1685,21 @@ Design requirements:
  if not response_text:
  return ""
 
- cleaned = re.sub(r'\*\*(.*?)\*\*', r'\1', response_text)
- cleaned = re.sub(r'\*(.*?)\*', r'\1', cleaned)
- cleaned = re.sub(r'`(.*?)`', r'\1', cleaned)
- cleaned = re.sub(r'#{1,6}\s*(.*)', r'\1', cleaned)
- cleaned = re.sub(r'\n\s*\n', '\n\n', cleaned)
- cleaned = cleaned.strip()
+ cleaned = _MD_BOLD_RE.sub(r'\1', response_text)
+ cleaned = _MD_ITALIC_RE.sub(r'\1', cleaned)
+ cleaned = _MD_CODE_RE.sub(r'\1', cleaned)
+ cleaned = _MD_HASH_RE.sub('', cleaned)
+ return _BLANK_RE.sub('\n\n', cleaned).strip()
 
- return cleaned
+
+# Global Gemini service instance - genai.Client holds an HTTP connection
+# pool, so constructing the service per request would pay TLS handshake and
+# pool setup every time.
+_gemini_service: Optional[GeminiService] = None
+
+def get_gemini_service() -> GeminiService:
+ """Get the global Gemini service instance."""
+ global _gemini_service
+ if _gemini_service is None:
+ _gemini_service = GeminiService()
+ return _gemini_service
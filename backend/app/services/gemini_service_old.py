@@ -50,7 +50,7 @@ class GeminiService:
             Complex legal terms:
             """
             
-            response = self.model.generate_content(prompt)
+            response = await self.model.generate_content_async(prompt)
             
             if response.text:
                 # Parse the response to extract terms
@@ -106,7 +106,7 @@ class GeminiService:
             Definition:
             """
             
-            response = self.model.generate_content(prompt)
+            response = await self.model.generate_content_async(prompt)
             
             if response.text:
                 definition = response.text.strip()
@@ -146,7 +146,7 @@ class GeminiService:
             Definition:
             """
             
-            response = self.model.generate_content(prompt)
+            response = await self.model.generate_content_async(prompt)
             
             if response.text:
                 definition = response.text.strip()
@@ -200,7 +200,7 @@ class GeminiService:
             Definitions:
             """
             
-            response = self.model.generate_content(prompt)
+            response = await self.model.generate_content_async(prompt)
             
             if response.text:
                 definitions = {}
@@ -254,7 +254,7 @@ class GeminiService:
             Simplified version:
             """
             
-            response = self.model.generate_content(prompt)
+            response = await self.model.generate_content_async(prompt)
             
             if response.text:
                 return response.text.strip()
@@ -308,7 +308,7 @@ class GeminiService:
             term3: simple explanation of term3]
             """
             
-            response = self.model.generate_content(prompt)
+            response = await self.model.generate_content_async(prompt)
             
             if response.text:
                 response_text = response.text.strip()
@@ -377,7 +377,7 @@ class GeminiService:
         try:
             logger.info(f"🤖 GEMINI: Generating response for prompt ({len(prompt)} chars)")
             
-            response = self.model.generate_content(prompt)
+            response = await self.model.generate_content_async(prompt)
             
             if response and response.text:
                 cleaned_response = self._clean_gemini_response(response.text)
@@ -0,0 +1,108 @@
+"""
+In-memory response cache for Gemini calls.
+Eliminates repeated network round trips and token spend for identical prompts.
+"""
+
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional, Dict
+from dataclasses import dataclass
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever a prompt template changes so stale responses self-invalidate.
+PROMPT_VERSION = "v3"
+
+@dataclass(slots=True, frozen=True)
+class LLMCacheEntry:
+    data: Any
+    expires_at: float  # time.monotonic() deadline
+
+class LLMResponseCache:
+    """
+    Exact-match cache for Gemini responses.
+
+    Keys are a SHA-256 over (prompt version, model, thinking level, prompt,
+    response schema), so any change to the request shape misses cleanly.
+    A semantic/embedding layer could sit in front of this for paraphrased
+    prompts, but the exact tier already covers the dominant case here:
+    the same document being re-processed.
+
+    Bounded LRU: hits refresh recency and inserts past the cap evict the
+    least recently used entry, so a long TTL can't grow memory without
+    limit. One RLock guards the map, mirroring the verification cache.
+    """
+
+    # Entries can carry multi-KB responses, so the cap is tighter than the
+    # verification cache's
+    _MAX_ENTRIES = 2048
+
+    def __init__(self):
+        self._cache: "OrderedDict[str, LLMCacheEntry]" = OrderedDict()
+        self.default_ttl = 7 * 86400  # 7 days
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def make_key(model: str, thinking_level: str, prompt: str, schema: str = "") -> str:
+        """Build the exact-match cache key for a generation request."""
+        payload = f"{PROMPT_VERSION}:{model}:{thinking_level}:{schema}:{prompt}"
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[Any]:
+        """Get a cached response, or None on miss/expiry."""
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is None:
+                return None
+
+            if time.monotonic() > entry.expires_at:
+                del self._cache[key]
+                return None
+
+            self._cache.move_to_end(key)
+
+        logger.debug(f"LLM cache hit: {key[:16]}")
+        return entry.data
+
+    def set(self, key: str, data: Any, ttl: int = None) -> None:
+        """Store a response in the cache."""
+        entry = LLMCacheEntry(
+            data=data,
+            expires_at=time.monotonic() + (ttl or self.default_ttl)
+        )
+        with self._lock:
+            self._cache[key] = entry
+            self._cache.move_to_end(key)
+            while len(self._cache) > self._MAX_ENTRIES:
+                self._cache.popitem(last=False)
+
+    def clear_expired(self) -> None:
+        """Remove expired entries from cache."""
+        now = time.monotonic()
+        with self._lock:
+            expired_keys = [
+                key for key, entry in self._cache.items()
+                if now > entry.expires_at
+            ]
+            for key in expired_keys:
+                del self._cache[key]
+
+        if expired_keys:
+            logger.info(f"Cleared {len(expired_keys)} expired LLM cache entries")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get cache statistics."""
+        with self._lock:
+            return {
+                'total_entries': len(self._cache)
+            }
+
+# Global cache instance
+_llm_cache = LLMResponseCache()
+
+def get_llm_cache() -> LLMResponseCache:
+    """Get the global LLM response cache instance."""
+    return _llm_cache
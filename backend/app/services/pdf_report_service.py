@@ -5,19 +5,35 @@ Professional PDF Report Generator
 Service for generating professional legal analysis reports in PDF format.
 """
 
+import asyncio
+import functools
 import logging
-from typing import Dict, Any
+import re
+import tempfile
+from typing import Dict, Any, BinaryIO
 from datetime import datetime
-import io
 from reportlab.lib.pagesizes import A4
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
 from reportlab.lib import colors
 from reportlab.lib.enums import TA_CENTER, TA_JUSTIFY
 
 logger = logging.getLogger(__name__)
 
+# Bullet markers at line starts, with surrounding indentation; matched in one
+# pass instead of a per-line Python loop
+_BULLET_RE = re.compile(r'(?m)^[ \t]*(?:•|-)\s*')
+
+@functools.lru_cache(maxsize=1024)
+def _format_analysis_timestamp(timestamp: str) -> str:
+ """Render an ISO analysis timestamp for the report header.
+ 
+ Memoized because the same stored analysis is often rendered more than
+ once (re-downloads, regenerate-PDF), and the parse is deterministic.
+ """
+ return datetime.fromisoformat(timestamp.replace('Z', '+00:00')).strftime("%B %d, %Y at %I:%M %p")
+
 class LegalReportGenerator:
  """
  Professional PDF report generator for legal document analysis.
@@ -86,6 +102,48 @@ class LegalReportGenerator:
  borderPadding=10
  )
  
+ # Disclaimer style
+ self.disclaimer_style = ParagraphStyle(
+ 'Disclaimer',
+ parent=self.styles['Normal'],
+ fontSize=10,
+ alignment=TA_JUSTIFY,
+ textColor=colors.Color(0.4, 0.4, 0.4),
+ borderWidth=1,
+ borderColor=colors.Color(0.8, 0.8, 0.8),
+ borderPadding=10
+ )
+ 
+ # Shared flowables. Reports append dozens of spacers and a handful of
+ # fixed paragraphs; ReportLab treats flowables as immutable during
+ # build(), so the same instances are reused across reports instead of
+ # allocating fresh ones each time.
+ self._list_table_style = TableStyle([
+ ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+ ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+ ('LEFTPADDING', (0, 0), (-1, -1), 0)
+ ])
+ self._sp_01 = Spacer(1, 0.1*inch)
+ self._sp_015 = Spacer(1, 0.15*inch)
+ self._sp_03 = Spacer(1, 0.3*inch)
+ self._sp_04 = Spacer(1, 0.4*inch)
+ self._title_para = Paragraph("LEGAL DOCUMENT ANALYSIS REPORT", self.title_style)
+ self._report_type_para = Paragraph("<b>Report Type:</b> Comprehensive Legal Analysis", self.body_style)
+ disclaimer_text = """
+ <b>LEGAL DISCLAIMER:</b><br/><br/>
+ This analysis is generated by LegalLens AI for informational purposes only. 
+ The content provided should not be considered as legal advice, and should not be 
+ relied upon as a substitute for consultation with qualified legal professionals. 
+ <br/><br/>
+ The accuracy and completeness of this analysis cannot be guaranteed, and LegalLens 
+ disclaims any liability for actions taken based on this information. For specific 
+ legal guidance related to your situation, please consult with a licensed attorney 
+ familiar with the relevant jurisdiction and area of law.
+ <br/><br/>
+ Generated by LegalLens AI Legal Assistant | www.legallens.ai
+ """
+ self._disclaimer_para = Paragraph(disclaimer_text, self.disclaimer_style)
+ 
  async def generate_comprehensive_report(
  self, 
  analysis_data: Dict[str, Any],
@@ -101,15 +159,33 @@ class LegalReportGenerator:
  Returns:
  PDF bytes
  """
+ output = await self.generate_report_spooled(analysis_data, filename)
+ try:
+ return output.read()
+ finally:
+ output.close()
+ 
+ async def generate_report_spooled(
+ self, 
+ analysis_data: Dict[str, Any],
+ filename: str = None
+ ) -> BinaryIO:
+ """
+ Generate the report into a spooled temp file, positioned at the start.
+ 
+ Small reports stay in memory; large ones spill to disk, so the PDF is
+ never held twice (render buffer plus a full bytes copy). Stream it to
+ the client with iter_pdf_chunks and close it when done.
+ """
  try:
  logger.info(" PDF GENERATOR: Starting comprehensive report generation")
  
  # Create PDF buffer
- buffer = io.BytesIO()
+ output = tempfile.SpooledTemporaryFile(max_size=4*1024*1024)
  
  # Create document with larger page size for more content
  doc = SimpleDocTemplate(
- buffer,
+ output,
  pagesize=A4,
  rightMargin=50,
  leftMargin=50,
@@ -121,8 +197,8 @@ class LegalReportGenerator:
  story = []
  
  # Title page
- story.append(Paragraph("LEGAL DOCUMENT ANALYSIS REPORT", self.title_style))
- story.append(Spacer(1, 0.3*inch))
+ story.append(self._title_para)
+ story.append(self._sp_03)
  
  # Document info
  if filename:
@@ -131,13 +207,13 @@ class LegalReportGenerator:
  timestamp = analysis_data.get("processing_metadata", {}).get("analysis_timestamp", "")
  if timestamp:
  try:
- formatted_time = datetime.fromisoformat(timestamp.replace('Z', '+00:00')).strftime("%B %d, %Y at %I:%M %p")
+ formatted_time = _format_analysis_timestamp(timestamp)
  story.append(Paragraph(f"<b>Analysis Date:</b> {formatted_time}", self.body_style))
  except Exception:
  story.append(Paragraph(f"<b>Analysis Date:</b> {timestamp}", self.body_style))
  
- story.append(Paragraph("<b>Report Type:</b> Comprehensive Legal Analysis", self.body_style))
- story.append(Spacer(1, 0.4*inch))
+ story.append(self._report_type_para)
+ story.append(self._sp_04)
  
  # Section 1: Comprehensive Document Summary
  story.append(Paragraph("DOCUMENT SUMMARY", self.section_style))
@@ -152,7 +228,7 @@ class LegalReportGenerator:
  else:
  story.append(Paragraph("No summary available for this document.", self.body_style))
  
- story.append(Spacer(1, 0.3*inch))
+ story.append(self._sp_03)
  
  # Section 2: Legal Terms and Meanings
  story.append(Paragraph("LEGAL TERMS AND MEANINGS", self.section_style))
@@ -160,30 +236,40 @@ class LegalReportGenerator:
  legal_terms = analysis_data.get("legal_terms_and_meanings", [])
  if legal_terms:
  story.append(Paragraph("The following legal terms are identified and explained:", self.body_style))
- story.append(Spacer(1, 0.1*inch))
+ story.append(self._sp_01)
  
+ # One table instead of a paragraph + spacer per term: ReportLab
+ # lays the whole section out in a single flowable pass
+ term_rows = []
  for i, term_data in enumerate(legal_terms, 1):
  term_name = term_data.get("term", "")
  definition = term_data.get("definition", "")
  source = term_data.get("source", "")
  
  if term_name and definition:
- term_text = f"<b>{i}. {term_name}:</b> {definition}"
+ definition_text = definition
  if source:
- term_text += f" <i>(Source: {source})</i>"
- story.append(Paragraph(term_text, self.term_style))
- story.append(Spacer(1, 0.1*inch))
+ definition_text += f" <i>(Source: {source})</i>"
+ term_rows.append([
+ Paragraph(f"<b>{i}. {term_name}:</b>", self.term_style),
+ Paragraph(definition_text, self.term_style)
+ ])
+ 
+ if term_rows:
+ terms_table = Table(term_rows, colWidths=[1.8*inch, 4.5*inch])
+ terms_table.setStyle(self._list_table_style)
+ story.append(terms_table)
  else:
  story.append(Paragraph("No specific legal terms were identified in this document.", self.body_style))
  
- story.append(Spacer(1, 0.3*inch))
+ story.append(self._sp_03)
  
  # Section 3: Risk Analysis
  story.append(Paragraph("RISK ANALYSIS", self.section_style))
  risk_analysis = analysis_data.get("risk_analysis", "No risk analysis available")
  if risk_analysis:
  story.append(Paragraph(risk_analysis, self.body_style))
- story.append(Spacer(1, 0.3*inch))
+ story.append(self._sp_03)
  
  # Section 4: Applicable Laws
  story.append(Paragraph("APPLICABLE LAWS", self.section_style))
@@ -191,27 +277,34 @@ class LegalReportGenerator:
  applicable_laws = analysis_data.get("applicable_laws", [])
  if applicable_laws:
  story.append(Paragraph("The following Indian laws are applicable to this document:", self.body_style))
- story.append(Spacer(1, 0.1*inch))
+ story.append(self._sp_01)
  
+ law_rows = []
  for i, law_data in enumerate(applicable_laws, 1):
  law_name = law_data.get("law", "")
  description = law_data.get("description", "")
  
  if law_name and description:
- law_text = f"<b>{i}. {law_name}:</b><br/>{description}"
- story.append(Paragraph(law_text, self.body_style))
- story.append(Spacer(1, 0.15*inch))
+ law_rows.append([
+ Paragraph(f"<b>{i}. {law_name}:</b><br/>{description}", self.body_style)
+ ])
+ 
+ if law_rows:
+ laws_table = Table(law_rows, colWidths=[6.3*inch])
+ laws_table.setStyle(self._list_table_style)
+ story.append(laws_table)
  else:
  story.append(Paragraph("No specific applicable laws were identified for this document.", self.body_style))
  
  # Section 5: Related Links and Resources
  related_links = analysis_data.get("related_links", [])
  if related_links:
- story.append(Spacer(1, 0.3*inch))
+ story.append(self._sp_03)
  story.append(Paragraph("RELATED LINKS AND RESOURCES", self.section_style))
  story.append(Paragraph("Additional resources for understanding legal aspects:", self.body_style))
- story.append(Spacer(1, 0.1*inch))
+ story.append(self._sp_01)
  
+ link_rows = []
  for i, link_data in enumerate(related_links, 1):
  title = link_data.get("title", "")
  url = link_data.get("url", "")
@@ -222,47 +315,27 @@ class LegalReportGenerator:
  if description:
  link_text += f"{description}<br/>"
  link_text += f"<i>URL: {url}</i>"
- story.append(Paragraph(link_text, self.term_style))
- story.append(Spacer(1, 0.1*inch))
- 
- # Footer and Disclaimer
- story.append(Spacer(1, 0.4*inch))
+ link_rows.append([Paragraph(link_text, self.term_style)])
  
- disclaimer_style = ParagraphStyle(
- 'Disclaimer',
- parent=self.styles['Normal'],
- fontSize=10,
- alignment=TA_JUSTIFY,
- textColor=colors.Color(0.4, 0.4, 0.4),
- borderWidth=1,
- borderColor=colors.Color(0.8, 0.8, 0.8),
- borderPadding=10
- )
+ if link_rows:
+ links_table = Table(link_rows, colWidths=[6.3*inch])
+ links_table.setStyle(self._list_table_style)
+ story.append(links_table)
  
- disclaimer_text = """
- <b>LEGAL DISCLAIMER:</b><br/><br/>
- This analysis is generated by LegalLens AI for informational purposes only. 
- The content provided should not be considered as legal advice, and should not be 
- relied upon as a substitute for consultation with qualified legal professionals. 
- <br/><br/>
- The accuracy and completeness of this analysis cannot be guaranteed, and LegalLens 
- disclaims any liability for actions taken based on this information. For specific 
- legal guidance related to your situation, please consult with a licensed attorney 
- familiar with the relevant jurisdiction and area of law.
- <br/><br/>
- Generated by LegalLens AI Legal Assistant | www.legallens.ai
- """
- story.append(Paragraph(disclaimer_text, disclaimer_style))
+ # Footer and Disclaimer
+ story.append(self._sp_04)
+ story.append(self._disclaimer_para)
  
- # Build PDF
- doc.build(story)
+ # Build PDF. Rendering is pure CPU work inside ReportLab, so it
+ # runs on a worker thread instead of blocking the event loop for
+ # the duration of the layout pass.
+ await asyncio.to_thread(doc.build, story)
  
- # Get PDF bytes
- pdf_bytes = buffer.getvalue()
- buffer.close()
+ size = output.tell()
+ output.seek(0)
  
- logger.info(f" PDF GENERATOR: Report generated successfully ({len(pdf_bytes)} bytes)")
- return pdf_bytes
+ logger.info(f" PDF GENERATOR: Report generated successfully ({size} bytes)")
+ return output
  
  except Exception as e:
  logger.error(f" PDF GENERATOR: Report generation failed: {str(e)}")
@@ -270,17 +343,19 @@ class LegalReportGenerator:
  
  def _format_text_with_bullets(self, text: str) -> str:
  """Format text with bullet points for better readability."""
- lines = text.split('\n')
- formatted_lines = []
- 
- for line in lines:
- line = line.strip()
- if line.startswith('•') or line.startswith('-'):
- formatted_lines.append(f"&bull; {line[1:].strip()}")
- elif line:
- formatted_lines.append(line)
- 
- return '<br/>'.join(formatted_lines)
+ formatted = _BULLET_RE.sub('&bull; ', text.strip())
+ return '<br/>'.join(line for line in map(str.strip, formatted.split('\n')) if line)
+
+async def iter_pdf_chunks(output: BinaryIO, size: int = 64*1024):
+ """Yield a spooled report in chunks for StreamingResponse, then close it."""
+ try:
+ while True:
+ chunk = output.read(size)
+ if not chunk:
+ break
+ yield chunk
+ finally:
+ output.close()
 
 # Service instance
 legal_report_generator = LegalReportGenerator()
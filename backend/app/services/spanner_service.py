@@ -3,7 +3,12 @@ Google Cloud Spanner Service for Legal Terms
 ============================================
 """
 
+import asyncio
 import logging
+import re
+import threading
+import time
+from datetime import timedelta
 from typing import Dict, List, Optional
 from google.cloud import spanner
 from app.config.settings import get_settings
@@ -11,6 +16,78 @@ from app.utils.credentials import get_credentials, get_project_id, is_credential
 
 logger = logging.getLogger(__name__)
 
+# Snapshot of the LegalTerm table used by find_terms_in_text, refreshed at
+# most every TTL. The pattern is one alternation over every term (longest
+# first so multi-word terms win over their prefixes), giving a single
+# case-insensitive pass over the text instead of one compile + search per
+# term per call. Guarded by a lock since requests run on multiple threads.
+_TERMS_CACHE_TTL_SECONDS = 300
+_terms_cache = {"ts": 0.0, "by_lower": {}, "pattern": None}
+_terms_cache_lock = threading.Lock()
+
+
+class _TermLookupBatcher:
+ """Coalesces concurrent single-term lookups into one bulk query.
+
+ Lookups arriving within the batching window (or until the batch cap is
+ hit) share a single UNNEST query instead of one round-trip each; terms
+ the bulk query misses fall back to the richer single lookup so partial
+ matching still works.
+ """
+ 
+ _WINDOW_SECONDS = 0.005
+ _MAX_BATCH = 64
+ 
+ def __init__(self, service: "SpannerService"):
+ self._service = service
+ self._pending: Dict[str, List[asyncio.Future]] = {}
+ self._flush_handle = None
+ 
+ async def request(self, term: str) -> Optional[str]:
+ loop = asyncio.get_running_loop()
+ future = loop.create_future()
+ self._pending.setdefault(term, []).append(future)
+ 
+ if len(self._pending) >= self._MAX_BATCH:
+ if self._flush_handle is not None:
+ self._flush_handle.cancel()
+ self._flush_handle = None
+ self._flush()
+ elif self._flush_handle is None:
+ self._flush_handle = loop.call_later(self._WINDOW_SECONDS, self._flush)
+ 
+ return await future
+ 
+ def _flush(self) -> None:
+ self._flush_handle = None
+ pending, self._pending = self._pending, {}
+ if pending:
+ asyncio.ensure_future(self._run_batch(pending))
+ 
+ async def _run_batch(self, pending: Dict[str, List[asyncio.Future]]) -> None:
+ terms = list(pending)
+ try:
+ definitions = await self._service.get_legal_term_definitions_bulk(terms)
+ except Exception as e:
+ logger.error(f"Batched term lookup failed: {str(e)}")
+ definitions = {}
+ 
+ # Bulk matching is exact-only; misses retry the single lookup, which
+ # also tries partial matches. These run concurrently.
+ missed = [term for term in terms if term not in definitions]
+ if missed:
+ fallbacks = await asyncio.gather(
+ *[self._service.get_legal_term_definition(term) for term in missed],
+ return_exceptions=True
+ )
+ for term, result in zip(missed, fallbacks):
+ definitions[term] = result if not isinstance(result, Exception) else None
+ 
+ for term, futures in pending.items():
+ for future in futures:
+ if not future.done():
+ future.set_result(definitions.get(term))
+
 class SpannerService:
  """Service for interacting with Google Cloud Spanner database."""
  
@@ -35,7 +112,12 @@ class SpannerService:
  credentials=credentials
  )
  self.instance = self.client.instance(self.settings.SPANNER_INSTANCE_ID)
- self.database = self.instance.database(self.settings.SPANNER_DATABASE_ID)
+ # Fixed-size session pool: sessions are created up front and
+ # reused, keeping session acquisition off the per-query path
+ self.database = self.instance.database(
+ self.settings.SPANNER_DATABASE_ID,
+ pool=spanner.FixedSizePool(size=10, default_timeout=5)
+ )
  logger.info(" Spanner client initialized successfully with base64 credentials")
  except Exception as e:
  logger.error(f" Failed to initialize Spanner client: {str(e)}")
@@ -46,6 +128,36 @@ class SpannerService:
  self.instance = None
  self.database = None
  
+ # Legal-term data changes rarely, so reads tolerate 15s of staleness.
+ # Stale reads can be served by the nearest replica without TrueTime
+ # commit-wait coordination, shaving latency off every lookup.
+ _READ_STALENESS = timedelta(seconds=15)
+ 
+ def _read_snapshot(self):
+ return self.database.snapshot(exact_staleness=self._READ_STALENESS)
+ 
+ @property
+ def _batcher(self) -> _TermLookupBatcher:
+ # Created lazily so construction stays cheap and no event loop is
+ # required at init time
+ batcher = getattr(self, '_lookup_batcher', None)
+ if batcher is None:
+ batcher = _TermLookupBatcher(self)
+ self._lookup_batcher = batcher
+ return batcher
+ 
+ async def get_legal_term_definition_batched(self, term: str) -> Optional[str]:
+ """
+ Like get_legal_term_definition, but coalesces concurrent callers into
+ one bulk query. Use when many independent lookups may be in flight;
+ latency is at most ~5ms worse than a lone call.
+ """
+ if not self.database:
+ logger.warning("Spanner database not available")
+ return None
+ 
+ return await self._batcher.request(term)
+ 
  async def get_legal_term_definition(self, term: str) -> Optional[str]:
  """
  Get definition for a single legal term from Spanner database.
@@ -61,78 +173,52 @@ class SpannerService:
  return None
  
  try:
- with self.database.snapshot() as snapshot:
+ with self._read_snapshot() as snapshot:
  logger.info(f"Searching Spanner for term: '{term}'")
  
- # First try exact match (case-insensitive)
+ # Exact and partial matching folded into one query: the ORDER BY
+ # ranks an exact match first, then prefix matches, then substring
+ # matches, so the happy and fallback paths cost a single RPC
  query = """
  SELECT term, meaning 
  FROM LegalTerm 
- WHERE LOWER(term) = LOWER(@term)
- LIMIT 1
- """
- results = snapshot.execute_sql(
- query,
- params={"term": term},
- param_types={"term": spanner.param_types.STRING}
- )
- 
- for row in results:
- found_term, meaning = row
- logger.info(f"Found exact match for term '{term}' -> '{found_term}': {meaning}")
- return meaning
- 
- # If no exact match, try partial matching
- logger.info(f"No exact match for '{term}', trying partial match")
- partial_query = """
- SELECT term, meaning 
- FROM LegalTerm 
- WHERE LOWER(term) LIKE LOWER(@term_pattern)
+ WHERE LOWER(term) = LOWER(@term) OR LOWER(term) LIKE LOWER(@term_pattern)
  ORDER BY 
  CASE 
- WHEN LOWER(term) = LOWER(@exact_term) THEN 1
+ WHEN LOWER(term) = LOWER(@term) THEN 1
  WHEN LOWER(term) LIKE LOWER(@term_start) THEN 2
  ELSE 3
  END
- LIMIT 5
+ LIMIT 1
  """
- term_pattern = f"%{term}%"
- term_start = f"{term}%"
- partial_results = snapshot.execute_sql(
- partial_query,
+ results = snapshot.execute_sql(
+ query,
  params={
- "term_pattern": term_pattern,
- "exact_term": term,
- "term_start": term_start
+ "term": term,
+ "term_pattern": f"%{term}%",
+ "term_start": f"{term}%"
  },
  param_types={
+ "term": spanner.param_types.STRING,
  "term_pattern": spanner.param_types.STRING,
- "exact_term": spanner.param_types.STRING,
  "term_start": spanner.param_types.STRING
  }
  )
  
- for row in partial_results:
+ for row in results:
  found_term, meaning = row
- logger.info(f"Found partial match: '{found_term}' for search term '{term}': {meaning}")
- # Return the first partial match
+ logger.info(f"Found match for term '{term}' -> '{found_term}': {meaning}")
  return meaning
  
- # Let's also try a broader search to see what terms exist
+ if self.settings.SPANNER_DEBUG:
+ # Diagnostic queries for empty-result investigation; two extra
+ # RPCs per miss, so only when explicitly enabled
  logger.info(f"No matches found for '{term}', checking if any terms exist in database")
- check_query = "SELECT COUNT(*) FROM LegalTerm"
- count_results = snapshot.execute_sql(check_query)
- for row in count_results:
- total_terms = row[0]
- logger.info(f"Total terms in database: {total_terms}")
+ for row in snapshot.execute_sql("SELECT COUNT(*) FROM LegalTerm"):
+ logger.info(f"Total terms in database: {row[0]}")
  break
  
- # Show a few sample terms for debugging
- sample_query = "SELECT term FROM LegalTerm LIMIT 5"
- sample_results = snapshot.execute_sql(sample_query)
- sample_terms = []
- for row in sample_results:
- sample_terms.append(row[0])
+ sample_terms = [row[0] for row in snapshot.execute_sql("SELECT term FROM LegalTerm LIMIT 5")]
  logger.info(f"Sample terms in database: {sample_terms}")
  
  return None
@@ -141,10 +227,6 @@ class SpannerService:
  logger.error(f"Error querying Spanner for term '{term}': {str(e)}")
  return None
  
- except Exception as e:
- logger.error(f"Error querying Spanner for term '{term}': {str(e)}")
- return None
- 
  async def find_terms_in_text(self, text: str) -> Dict[str, str]:
  """
  Scan ALL Spanner terms against the provided text and return matches.
@@ -163,26 +245,39 @@ class SpannerService:
  return {}
  
  try:
- import re
- 
- # Get all terms from the database
- with self.database.snapshot() as snapshot:
+ now = time.time()
+ with _terms_cache_lock:
+ by_lower = _terms_cache["by_lower"]
+ pattern = _terms_cache["pattern"]
+ stale = now - _terms_cache["ts"] > _TERMS_CACHE_TTL_SECONDS
+ 
+ if stale:
+ # Refetch the table and rebuild the alternation once per TTL
+ with self._read_snapshot() as snapshot:
  query = "SELECT term, meaning FROM LegalTerm"
- results = snapshot.execute_sql(query)
+ rows = list(snapshot.execute_sql(query))
+ 
+ by_lower = {term.lower(): (term, meaning) for term, meaning in rows}
+ if by_lower:
+ keys = sorted(by_lower, key=len, reverse=True)
+ pattern = re.compile(
+ r'\b(?:' + '|'.join(re.escape(key) for key in keys) + r')\b',
+ re.IGNORECASE
+ )
+ else:
+ pattern = None
+ with _terms_cache_lock:
+ _terms_cache["ts"] = now
+ _terms_cache["by_lower"] = by_lower
+ _terms_cache["pattern"] = pattern
+ 
+ if pattern is None:
+ return {}
  
  found_terms = {}
- text_lower = text.lower()
- 
- for row in results:
- term, meaning = row
- 
- # Create regex pattern for case-insensitive whole word matching
- pattern = re.compile(rf'\b{re.escape(term.lower())}\b', re.IGNORECASE)
- 
- # Check if term exists in text
- if pattern.search(text_lower):
- found_terms[term] = meaning
- logger.debug(f"Found Spanner term in text: '{term}'")
+ for match in pattern.finditer(text):
+ original_term, meaning = by_lower[match.group(0).lower()]
+ found_terms[original_term] = meaning
  
  logger.info(f"Found {len(found_terms)} Spanner terms in provided text")
  return found_terms
@@ -209,38 +304,29 @@ class SpannerService:
  return {}
  
  try:
- with self.database.snapshot() as snapshot:
- # Create parameterized query for multiple terms
- # Use LOWER() to make case-insensitive comparison
- placeholders = []
- params = {}
- param_types = {}
- 
- for i, term in enumerate(terms):
- param_name = f"term_{i}"
- placeholders.append(f"LOWER(@{param_name})")
- params[param_name] = term.lower()
- param_types[param_name] = spanner.param_types.STRING
- 
- placeholders_str = ", ".join(placeholders)
- 
- query = f"""
+ with self._read_snapshot() as snapshot:
+ # One array parameter keeps the SQL text identical regardless of
+ # how many terms are requested, so Spanner can reuse the cached
+ # query plan across calls
+ query = """
  SELECT term, meaning 
  FROM LegalTerm 
- WHERE LOWER(term) IN ({placeholders_str})
+ WHERE LOWER(term) IN UNNEST(@terms)
  """
+ results = snapshot.execute_sql(
+ query,
+ params={"terms": [term.lower() for term in terms]},
+ param_types={"terms": spanner.param_types.Array(spanner.param_types.STRING)}
+ )
  
- results = snapshot.execute_sql(query, params=params, param_types=param_types)
- 
- # Build result dictionary
+ # Key results by the lowercased requested term, as before
+ requested = {term.lower() for term in terms}
  definitions = {}
  for row in results:
  term, meaning = row
- # Use the original case from database, but key with lowercase for matching
- for original_term in terms:
- if term.lower() == original_term.lower():
- definitions[original_term.lower()] = meaning
- break
+ term_lower = term.lower()
+ if term_lower in requested:
+ definitions[term_lower] = meaning
  
  return definitions
  
@@ -248,6 +334,48 @@ class SpannerService:
  logger.error(f"Error querying Spanner for multiple terms: {str(e)}")
  return {}
  
+ async def get_legal_term_definitions_bulk(self, terms: List[str]) -> Dict[str, str]:
+ """
+ Look up many legal terms in one round-trip using an UNNEST array param.
+ 
+ Args:
+ terms: List of legal terms to look up
+ 
+ Returns:
+ Dictionary mapping the original terms to their definitions
+ (terms with no match are omitted)
+ """
+ if not self.database:
+ logger.warning("Spanner database not available")
+ return {}
+ 
+ if not terms:
+ return {}
+ 
+ try:
+ with self._read_snapshot() as snapshot:
+ query = """
+ SELECT term, meaning 
+ FROM LegalTerm 
+ WHERE LOWER(term) IN UNNEST(@terms)
+ """
+ results = snapshot.execute_sql(
+ query,
+ params={"terms": [term.lower() for term in terms]},
+ param_types={"terms": spanner.param_types.Array(spanner.param_types.STRING)}
+ )
+ 
+ by_lower = {row[0].lower(): row[1] for row in results}
+ return {
+ term: by_lower[term.lower()]
+ for term in terms
+ if term.lower() in by_lower
+ }
+ 
+ except Exception as e:
+ logger.error(f"Error bulk querying Spanner for {len(terms)} terms: {str(e)}")
+ return {}
+ 
  async def add_legal_term(self, term_id: str, term: str, meaning: str) -> bool:
  """
  Add a new legal term to the database.
@@ -271,6 +399,11 @@ class SpannerService:
  columns=("term_id", "term", "meaning"),
  values=[(term_id, term, meaning)]
  )
+ 
+ # New terms must show up in the scan; expire the snapshot so the
+ # next find_terms_in_text rebuilds its pattern
+ with _terms_cache_lock:
+ _terms_cache["ts"] = 0.0
  return True
  
  except Exception as e:
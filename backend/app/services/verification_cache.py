@@ -3,30 +3,55 @@ Simple in-memory caching service for verification results.
 Reduces repeated Spanner queries and improves performance.
 """
 
+import hashlib
 import logging
+import threading
 import time
+from collections import OrderedDict
 from typing import Dict, Any, Optional
 from dataclasses import dataclass
 
 logger = logging.getLogger(__name__)
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class CacheEntry:
  data: Dict[str, Any]
- timestamp: float
- ttl: int # Time to live in seconds
+ expires_at: float # time.monotonic() deadline
 
 class VerificationCache:
  """Simple in-memory cache for verification results."""
  
+ # Upper bound on cached verifications; oldest-written entries are
+ # evicted first once full, so long-running servers stay flat on RSS
+ _MAX_ENTRIES = 10_000
+ 
  def __init__(self):
- self._cache: Dict[str, CacheEntry] = {}
+ # OrderedDict so stale entries can be evicted from the front; one
+ # RLock guards both maps since request handlers run on multiple
+ # threads and plain dict mutation is not safe under concurrency
+ self._cache: "OrderedDict[str, CacheEntry]" = OrderedDict()
  self.default_ttl = 3600 # 1 hour
- self._request_timestamps: Dict[str, float] = {} # Track request times
+ self._request_timestamps: "OrderedDict[str, float]" = OrderedDict() # Track request times
  self.throttle_window = 60 # 60 seconds between requests
+ self._lock = threading.RLock()
+ 
+ @staticmethod
+ def hash_content(data: bytes) -> str:
+ """Hash content for use as a cache key component.
+ 
+ blake2b at 16 bytes is considerably faster than SHA-256 and plenty
+ for cache keying. Callers that do not already hold a content digest
+ should use this rather than hashing with a cryptographic-strength
+ algorithm just to build a key.
+ """
+ return hashlib.blake2b(data, digest_size=16).hexdigest()
  
  def _generate_cache_key(self, document_id: str, content_hash: str = None) -> str:
- """Generate cache key for document verification."""
+ """Generate cache key for document verification.
+ 
+ content_hash may be any digest string; hash_content output is used
+ as-is, longer digests are truncated to 16 hex chars.
+ """
  if content_hash:
  return f"verify:{document_id}:{content_hash[:16]}"
  return f"verify:{document_id}"
@@ -36,15 +61,15 @@ class VerificationCache:
  try:
  cache_key = self._generate_cache_key(document_id, content_hash)
  
- if cache_key not in self._cache:
+ with self._lock:
+ entry = self._cache.get(cache_key)
+ 
+ if entry is None:
  logger.debug(f"Cache miss for key: {cache_key}")
  return None
  
- entry = self._cache[cache_key]
- current_time = time.time()
- 
  # Check if entry has expired
- if current_time - entry.timestamp > entry.ttl:
+ if time.monotonic() > entry.expires_at:
  logger.debug(f"Cache entry expired for key: {cache_key}")
  del self._cache[cache_key]
  return None
@@ -58,7 +83,18 @@ class VerificationCache:
  
  def is_throttled(self, document_id: str) -> bool:
  """Check if request should be throttled."""
- current_time = time.time()
+ current_time = time.monotonic()
+ 
+ with self._lock:
+ # Timestamps are inserted in time order, so everything older than
+ # the window sits at the front and can be dropped as we go -- the
+ # map never grows past the documents seen in the last minute
+ while self._request_timestamps:
+ oldest_doc, oldest_time = next(iter(self._request_timestamps.items()))
+ if current_time - oldest_time < self.throttle_window:
+ break
+ del self._request_timestamps[oldest_doc]
+ 
  last_request = self._request_timestamps.get(document_id)
  
  if last_request and (current_time - last_request) < self.throttle_window:
@@ -67,6 +103,7 @@ class VerificationCache:
  
  # Update timestamp
  self._request_timestamps[document_id] = current_time
+ self._request_timestamps.move_to_end(document_id)
  return False
  
  def set(self, document_id: str, verification_result: Dict[str, Any], 
@@ -76,13 +113,19 @@ class VerificationCache:
  cache_key = self._generate_cache_key(document_id, content_hash)
  ttl = ttl or self.default_ttl
  
+ # The deadline is computed once here so get() is a single float
+ # comparison; monotonic also can't jump backwards with wall-clock
+ # adjustments and expire everything spuriously
  entry = CacheEntry(
  data=verification_result,
- timestamp=time.time(),
- ttl=ttl
+ expires_at=time.monotonic() + ttl
  )
  
+ with self._lock:
  self._cache[cache_key] = entry
+ self._cache.move_to_end(cache_key)
+ while len(self._cache) > self._MAX_ENTRIES:
+ self._cache.popitem(last=False)
  logger.info(f"Cached verification result for: {document_id} (TTL: {ttl}s)")
  
  except Exception as e:
@@ -91,8 +134,8 @@ class VerificationCache:
  def invalidate(self, document_id: str) -> None:
  """Invalidate all cache entries for a document."""
  try:
- keys_to_remove = [key for key in self._cache.keys() if key.startswith(f"verify:{document_id}")]
- 
+ with self._lock:
+ keys_to_remove = [key for key in self._cache if key.startswith(f"verify:{document_id}")]
  for key in keys_to_remove:
  del self._cache[key]
  
@@ -105,13 +148,13 @@ class VerificationCache:
  def clear_expired(self) -> None:
  """Remove expired entries from cache."""
  try:
- current_time = time.time()
- expired_keys = []
- 
- for key, entry in self._cache.items():
- if current_time - entry.timestamp > entry.ttl:
- expired_keys.append(key)
+ now = time.monotonic()
  
+ with self._lock:
+ expired_keys = [
+ key for key, entry in self._cache.items()
+ if now > entry.expires_at
+ ]
  for key in expired_keys:
  del self._cache[key]
  
@@ -123,17 +166,19 @@ class VerificationCache:
  
  def get_stats(self) -> Dict[str, Any]:
  """Get cache statistics."""
- current_time = time.time()
- expired_count = 0
+ now = time.monotonic()
  
- for entry in self._cache.values():
- if current_time - entry.timestamp > entry.ttl:
- expired_count += 1
+ with self._lock:
+ total = len(self._cache)
+ expired_count = sum(
+ 1 for entry in self._cache.values()
+ if now > entry.expires_at
+ )
  
  return {
- 'total_entries': len(self._cache),
+ 'total_entries': total,
  'expired_entries': expired_count,
- 'active_entries': len(self._cache) - expired_count
+ 'active_entries': total - expired_count
  }
 
 # Global cache instance
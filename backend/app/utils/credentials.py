@@ -7,22 +7,59 @@ Prioritizes base64 encoded credentials over file paths for better security and d
 """
 
 import base64
+import functools
 import json
 import os
 import logging
+import threading
 from typing import Optional, Dict, Any
 from google.oauth2 import service_account
 
 logger = logging.getLogger(__name__)
 
+# One transport object shared by every token refresh. Each Request() owns a
+# requests.Session with its own connection pool, so reusing it keeps the TLS
+# connection to the OAuth endpoint alive across refreshes instead of
+# re-handshaking every time. Created lazily; double-checked under a lock.
+_oauth_request = None
+_oauth_request_lock = threading.Lock()
+
+@functools.lru_cache(maxsize=1)
+def decoded_service_account_from_env() -> Optional[Dict[str, Any]]:
+ """Decode FIREBASE_SERVICE_ACCOUNT_KEY_B64 once per process.
+ 
+ Environment variables don't change while the process runs, so the
+ base64 decode and JSON parse of the multi-KB key are memoized; every
+ credentials path shares this one result.
+ """
+ base64_key = os.getenv('FIREBASE_SERVICE_ACCOUNT_KEY_B64')
+ if not base64_key:
+ return None
+ return json.loads(base64.b64decode(base64_key).decode('utf-8'))
+
+def _get_oauth_request():
+ global _oauth_request
+ if _oauth_request is None:
+ with _oauth_request_lock:
+ if _oauth_request is None:
+ import google.auth.transport.requests
+ _oauth_request = google.auth.transport.requests.Request()
+ return _oauth_request
+
 class CredentialsManager:
  """Manages Google Cloud service account credentials with base64 priority."""
  
  _instance = None
  _credentials = None
  _service_account_info = None
+ _lock = threading.Lock()
  
  def __new__(cls):
+ # Double-checked locking: without it, two threads touching the
+ # manager at the same time could each build an instance and run a
+ # duplicate token refresh
+ if cls._instance is None:
+ with cls._lock:
  if cls._instance is None:
  cls._instance = super().__new__(cls)
  return cls._instance
@@ -46,9 +83,7 @@ class CredentialsManager:
  )
  
  # Force token refresh to ensure we have an access token
- import google.auth.transport.requests
- request = google.auth.transport.requests.Request()
- credentials.refresh(request)
+ credentials.refresh(_get_oauth_request())
  
  # Verify we got an access token (not id_token)
  if hasattr(credentials, 'token') and credentials.token and credentials.token.startswith('ya29.'):
@@ -66,11 +101,10 @@ class CredentialsManager:
  """Load service account credentials with base64 priority."""
  try:
  # Priority 1: Base64 encoded service account (RECOMMENDED)
- base64_key = os.getenv('FIREBASE_SERVICE_ACCOUNT_KEY_B64')
- if base64_key:
+ service_account_info = decoded_service_account_from_env()
+ if service_account_info:
  logger.info(" Loading credentials from base64 environment variable")
- decoded_json = base64.b64decode(base64_key).decode('utf-8')
- self._service_account_info = json.loads(decoded_json)
+ self._service_account_info = service_account_info
  
  logger.info(f" Service account info loaded: {self._service_account_info.get('client_email')}")
  logger.info(f" Project ID: {self._service_account_info.get('project_id')}")
@@ -127,13 +161,34 @@ class CredentialsManager:
  ]
  
  def get_fresh_credentials(self) -> Optional[service_account.Credentials]:
- """Get fresh credentials with proper token generation."""
+ """Get credentials with a valid access token, refreshing only when needed."""
  if not self._service_account_info:
  logger.warning(" No service account info available for fresh credentials")
  return self._credentials
  
+ # The cached credentials are good until their token expires; skip the
+ # OAuth round-trip entirely in that case
+ credentials = self._credentials
+ if credentials is not None and credentials.valid:
+ return credentials
+ 
+ with self._lock:
+ credentials = self._credentials
+ if credentials is not None and credentials.valid:
+ return credentials
+ 
+ if credentials is not None:
+ # Refresh in place instead of rebuilding from scratch; the SDK
+ # keeps the same object and just swaps the token
+ try:
+ credentials.refresh(_get_oauth_request())
+ return credentials
+ except Exception as e:
+ logger.warning(f" In-place token refresh failed, recreating credentials: {e}")
+ 
  logger.info(" Creating fresh credentials...")
- return self._create_working_credentials(self._service_account_info)
+ self._credentials = self._create_working_credentials(self._service_account_info)
+ return self._credentials
  
  @property
  def credentials(self) -> Optional[service_account.Credentials]:
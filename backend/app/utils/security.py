@@ -45,12 +45,10 @@ def get_service_account_credentials() -> Optional[Dict[Any, Any]]:
  Service account credentials as dictionary or None
  """
  try:
- # Only use base64 environment variable (file path support removed)
- base64_key = os.getenv('FIREBASE_SERVICE_ACCOUNT_KEY_B64')
- if base64_key:
- return decode_base64_to_json(base64_key)
- 
- return None
+ # Delegates to the cached decoder so the key is only parsed once
+ # per process regardless of which path asks for it
+ from app.utils.credentials import decoded_service_account_from_env
+ return decoded_service_account_from_env()
  
  except Exception as e:
  raise Exception(f"Error getting service account credentials: {str(e)}")